@@ -0,0 +1,83 @@
+import random
+from functools import partial
+
+from algorithms.kl import init_partition, kl_outer_loop, lookahead_moves
+from algorithms.observer import Observer
+from model.circuit import Circuit
+from model.data import Data
+from model.hypergraph import Hypergraph
+
+
+def fm(
+    circuit: Circuit,
+    observer: Observer = None,
+    passes=6,
+    tolerance=0.05,
+    lookahead=0.0,
+    large_net=0,
+    rng=random,
+) -> Data:
+    """
+    perform the Fiduccia-Mattheyses Partition algorithm in the given circuit:
+    the KL passes, but every move is the best one that keeps both blocks
+    within the balance tolerance, rather than a move out of the heavier block
+    :param tolerance: the weight of a block may reach (0.5 + tolerance) of
+                      the total weight, e.g. 0.05 for a 45/55 balance
+    :param lookahead: bound the passes, see lookahead_moves; 0 for full passes
+    :param large_net: nets with more pins are left out of the gains, 0 to
+                      keep every net
+    :param rng: random stream of the initial partition and the tie-breaks
+    :return: data container holding the best partition found
+    """
+    observer = observer or Observer()
+    hypergraph = circuit.hypergraph
+    data = init_partition(hypergraph, large_net=large_net, rng=rng)
+    observer.on_pass(data)
+
+    select = partial(select_legal_move, limit=balance_limit(hypergraph, tolerance))
+    lookahead = lookahead_moves(hypergraph.get_cells_size(), lookahead)
+    return kl_outer_loop(hypergraph, data, observer, passes, select, lookahead, rng)
+
+
+def balance_limit(hypergraph: Hypergraph, tolerance) -> int:
+    """
+    :return: the max weight of a block, at least the weight of the lighter
+             half plus the heaviest cell, so that a balanced partition can
+             always move
+    """
+    weights = hypergraph.cell_weights
+    total = int(weights.sum())
+    return max(int((0.5 + tolerance) * total), total // 2 + int(weights.max()))
+
+
+def select_legal_move(data: Data, rng=random, limit=0) -> int:
+    """
+    choose the max gain node of the blocks whose move keeps the destination
+    block within the limit; only the first node of the max gain bucket of
+    each block is considered, so the choice is O(1)
+    :param limit: the max weight of a block
+    :return: the id of the chosen node, or -1 if neither move is legal
+    """
+    legal = []
+    for block_id in (0, 1):
+        if not data.block_has_unlocked_nodes(block_id):
+            continue
+        cid = data.peek_block_max_gain_node(block_id)
+        weight = data.get_block_weight(1 - block_id) + data.get_node_weight(cid)
+        if weight <= limit:
+            legal.append(block_id)
+
+    if not legal:
+        return -1
+    if len(legal) == 1:
+        return data.pop_block_max_gain(legal[0])
+
+    block0_gain, block1_gain = data.peek_block_max_gain(0), data.peek_block_max_gain(1)
+    if block0_gain != block1_gain:
+        return data.pop_block_max_gain(0 if block0_gain > block1_gain else 1)
+
+    # break tie by moving out of the heavier block
+    block0_weight, block1_weight = data.get_block_weight(0), data.get_block_weight(1)
+    if block0_weight != block1_weight:
+        return data.pop_block_max_gain(0 if block0_weight > block1_weight else 1)
+    return data.pop_block_max_gain(rng.choice([0, 1]))
@@ -1,210 +1,381 @@
 import bisect
 import logging
 import random
-from collections import Counter
-from functools import reduce
+from concurrent.futures import Executor, ProcessPoolExecutor
 from typing import List
 
-from algorithms.kl import init_partition, kl_inner_loop
+import numpy as np
+
+from algorithms.kl import (
+    calculate_cutsizes,
+    init_partition,
+    kl_inner_loop,
+    kl_inner_stop,
+    lookahead_moves,
+    report_counters,
+)
+from algorithms.observer import Observer
 from model.circuit import Circuit
 from model.data import Data
-
-
-def genetic(circuit: Circuit, app=None):
+from model.hypergraph import Hypergraph
+from model.population import Population
+from util.metrics import metrics
+from util.trace import trace
+
+
+def genetic(
+    circuit: Circuit,
+    observer: Observer = None,
+    offspring=1,
+    workers=0,
+    lookahead=0.0,
+    large_net=0,
+    rng=random,
+) -> Data:
     """
     perform the Genetic Partition algorithm in the given circuit
+    :param offspring: the number of offspring produced per generation
+    :param workers: the number of processes running the local improvement,
+                    0 to run it in this process
+    :param lookahead: bound the local improvement pass, see lookahead_moves;
+                      0 for a full pass
+    :param large_net: nets with more pins are left out of the gains of the
+                      local improvement, 0 to keep every net
+    :param rng: random stream of the whole run, a random.Random for
+                reproducible runs; every offspring improvement draws its own
+                seed from it
+    :return: the best chromosome of the final population
     """
+    observer = observer or Observer()
     # come up a random population
-    population = random_population(circuit)
-
-    if app is not None:
-        app.root.after(100, genetic_loop, circuit, population, app)
-    else:
-        genetic_loop(circuit, population, app)
-
+    hypergraph = circuit.hypergraph
+    with metrics.timer("population"):
+        population = random_population(hypergraph, rng=rng)
+    lookahead = lookahead_moves(hypergraph.get_cells_size(), lookahead)
+
+    executor = None
+    if workers > 0:
+        executor = ProcessPoolExecutor(
+            workers, initializer=init_worker, initargs=(hypergraph,)
+        )
 
-def genetic_loop(circuit, population, app=None):
+    try:
+        stop = False
+        while not stop:
+            stop, _ = genetic_loop(
+                hypergraph, population, offspring, executor, lookahead, large_net, rng
+            )
+            # render the best chromeosome among the population
+            observer.on_generation(population)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # only the best chromosome is turned back into a full data container
+    best = population.get_block_ids(population.best())
+    return init_partition(hypergraph, best.tolist())
+
+
+def genetic_loop(
+    hypergraph: Hypergraph,
+    population: Population,
+    offspring=1,
+    executor: Executor = None,
+    lookahead=0,
+    large_net=0,
+    rng=random,
+):
     """
-    perform the loop of the Genetric Partition algorithm
+    perform one generation of the Genetric Partition algorithm
+    :param lookahead: see kl_inner_loop
+    :param large_net: see init_partition
+    :param rng: random stream of the generation
+    :return: whether the stopping criterion is met, and the best chromosome index
     """
-    # select two members from the population
-    parents, fitness_list = select_parents(population)
-    # combine parents to produce 2 offspring
-    offspring = crossover(population, parents)
+    # the genetic operators draw from a numpy stream, seeded from rng
+    generator = np.random.default_rng(rng.getrandbits(32))
+    # select two members from the population, for every pair of offspring
+    with metrics.timer("selection"):
+        parents_list = [select_parents(population, rng)[0] for _ in range(offspring)]
+    # combine every pair of parents to produce 2 offspring
+    with metrics.timer("crossover"):
+        children = crossover(population, parents_list, generator)
     # perform mutation operation on offspring
-    mutation(offspring)
+    with metrics.timer("mutation"):
+        mutation(children, generator)
+    # the local improvement of every offspring gets its own random
+    # stream, so a generation does not depend on the number of workers
+    tasks = [
+        (
+            [children[2 * i], children[2 * i + 1]],
+            rng.getrandbits(32),
+            lookahead,
+            large_net,
+        )
+        for i in range(offspring)
+    ]
+
     # perfrom local improvement on offspring
-    offspring = local_improvement(circuit, offspring)
+    with metrics.timer("improvement"):
+        if executor is None:
+            improved = [improve_offspring(task, hypergraph) for task in tasks]
+        else:
+            improved = list(executor.map(improve_offspring, tasks))
+
     # replace some members in population with offspring
-    replace(population, fitness_list, parents, offspring)
+    with metrics.timer("replacement"):
+        replacements = []
+        for parents, (block_ids, mincut, moves) in zip(parents_list, improved):
+            population.moves += moves
+            fitness_list = calculate_fitness(population)
+            replaced = replace(population, fitness_list, parents, block_ids, mincut)
+            replacements.append({"mincut": int(mincut), "replaced": replaced})
+    population.generation += 1
+    metrics.count("generations")
     # check the stopping criterion
-    stop, best = stopping_criterion(population)
-
-    if app is not None:
-        # render the best chromeosome among the population
-        app.update_canvas(best)
-        if not stop:
-            app.root.after(100, genetic_loop, circuit, population, app)
-        else:
-            app.update_partition_button(True)
-    elif not stop:
-        genetic_loop(circuit, population)
+    return stopping_criterion(population, replacements)
 
 
-def stopping_criterion(population):
+def stopping_criterion(population: Population, replacements=None):
     """
     the genetic algorithm stopped when 80% of the population is
     occupied by solution with the same quality
+    :param replacements: the offspring of the generation and the member
+                         each one replaced, for the trace
+    :return: whether the criterion is met, and the index of the best chromosome
     """
-    best, freq = None, Counter()
-    for chromosome in population:
-        if not best or chromosome.mincut < best.mincut:
-            best = chromosome
-        freq[chromosome.mincut] += 1
-    rate = (freq[best.mincut] + freq[best.mincut + 1]) / 50
-    logging.info("mincut: {} | rate: {:.2%}".format(best.mincut, rate))
+    best = population.best()
+    mincut = population.get_mincut(best)
+    # no chromosome is better than the best, so this counts mincut and mincut + 1
+    rate = np.count_nonzero(population.mincuts <= mincut + 1) / population.size()
+    logging.info(
+        "mincut: {} | rate: {:.2%} | diversity: {:.1f}".format(
+            mincut, rate, population.diversity()
+        )
+    )
+    if trace.enabled:
+        trace.event(
+            "generation",
+            generation=population.generation,
+            best=mincut,
+            mean=round(float(population.mincuts.mean()), 3),
+            worst=population.get_mincut(population.worst()),
+            rate=rate,
+            diversity=round(population.diversity(), 3),
+            replacements=replacements or [],
+        )
     return rate >= 0.8, best
 
 
-def random_population(circuit: Circuit, k=50) -> List[Data]:
+def random_population(hypergraph: Hypergraph, k=50, rng=random) -> Population:
     """
     initialize population as k chromosomes, each representing a potential solution
     """
-    population = [init_partition(circuit) for _ in range(k)]
-    return population
+    n = hypergraph.get_cells_size()
+    chromosomes = np.empty((k, n), dtype=np.uint8)
+    for i in range(k):
+        # randomly partition the nodes equally, like init_partition
+        chromosomes[i] = np.asarray(rng.sample(range(n), n)) % 2
+    return Population(chromosomes, calculate_cutsizes(hypergraph, chromosomes))
 
 
-def select_parents(population):
+def select_parents(population: Population, rng=random):
     """
     select parents from the population, based on the fitness function
     """
-    # calculate the worst and best cutsize
-    worst_cutsize, best_cutsize = population[0].mincut, population[0].mincut
-    for chromosome in population:
-        worst_cutsize = max(chromosome.mincut, worst_cutsize)
-        best_cutsize = min(chromosome.mincut, best_cutsize)
-
     # calculate fitness value for each chromeosome in population
-    F, fitness_list, search_list = 0, [], []
-    for chromosome in population:
-        f = fitness(chromosome, worst_cutsize, best_cutsize)
-        F += f
-        fitness_list.append(f)
-        search_list.append(F)
+    fitness_list = calculate_fitness(population)
+    search_list = np.cumsum(fitness_list).tolist()
+    F = search_list[-1]
 
     # select two parents
-    parents = [search_parent(search_list, F), search_parent(search_list, F)]
+    parents = [search_parent(search_list, F, rng), search_parent(search_list, F, rng)]
 
     return parents, fitness_list
 
 
-def fitness(chromosome: Data, worst_cutsize, best_cutsize) -> int:
+def calculate_fitness(population: Population) -> List[int]:
+    """
+    :return: fitness value of each chromeosome in population
+    """
+    # calculate the worst and best cutsize
+    mincuts = population.mincuts
+    worst_cutsize, best_cutsize = int(mincuts.max()), int(mincuts.min())
+
+    return fitness(mincuts, worst_cutsize, best_cutsize).tolist()
+
+
+def fitness(mincuts, worst_cutsize, best_cutsize):
     """
     :return: fitness_i = (C_w - C_i) + (C_w - C_b) // 3
     """
-    return (worst_cutsize - chromosome.mincut) + (worst_cutsize - best_cutsize) // 3
+    return (worst_cutsize - mincuts) + (worst_cutsize - best_cutsize) // 3
 
 
-def search_parent(search_list, F):
+def search_parent(search_list, F, rng=random):
     """
     select a parent with the probability that is propotional to its fitness value
     :return: the index of parent selected
     """
-    return bisect.bisect_left(search_list, random.random() * F)
+    return bisect.bisect_left(search_list, rng.random() * F)
 
 
-def crossover(population, parent_indexes, k=5):
+def crossover(population: Population, parents_list, rng, k=5) -> np.ndarray:
     """
-    perfrom 5-point crossover to produce 2 offspring
-    :return: generated offsping
+    perfrom 5-point crossover on every pair of parents, to produce 2 offspring each
+    :param rng: numpy random generator
+    :return: generated offsping, the offspring of pair i in rows 2i and 2i + 1
     """
-    parents = [population[p].get_node_block_ids() for p in parent_indexes]
-    n = len(parents[0])  # cell size
-    crossover_points = sorted(random.sample(range(n), k))
-
-    offspring = [], []
-    j = 0
-    for i in range(n):
-        offspring[0].append(parents[j % 2][i])
-        offspring[1].append(
-            parents[j % 2][i] if j % 2 == 0 else flip(parents[j % 2][i])
-        )
-        if j < k and i == crossover_points[j]:
-            j += 1
-
+    pairs = np.asarray(parents_list)
+    first = population.chromosomes[pairs[:, 0]]
+    second = population.chromosomes[pairs[:, 1]]
+    pairs_size, n = first.shape  # number of pairs, cell size
+
+    # small netlists have fewer cells than crossover points
+    k = min(k, n - 1)
+    if k < 1:
+        return np.repeat(first, 2, axis=0)
+
+    # every crossover point swaps the parent copied from the next cell on
+    points = np.argpartition(rng.random((pairs_size, n)), k - 1, axis=1)[:, :k]
+    swaps = np.zeros((pairs_size, n + 1), dtype=np.uint8)
+    np.put_along_axis(swaps, points + 1, 1, axis=1)
+    odd = np.bitwise_xor.accumulate(swaps[:, :n], axis=1).astype(bool)
+
+    # the second offspring copies the complement of the second parent
+    offspring = np.empty((2 * pairs_size, n), dtype=np.uint8)
+    offspring[0::2] = np.where(odd, second, first)
+    offspring[1::2] = np.where(odd, second ^ 1, first)
     return offspring
 
 
-def mutation(offspring):
+def mutation(offspring: np.ndarray, rng):
     """
     perfrom mutation operation on offspring, and maintain the balance constraint
+    :param rng: numpy random generator
+    """
+    children_size, n = offspring.shape
+
+    # perform mutation operation, flipping up to 1% of the cells of every child
+    counts = rng.integers(0, n // 100, endpoint=True, size=children_size)
+    rows, cols = random_cells(rng.random((children_size, n)), counts)
+    offspring[rows, cols] ^= 1
+
+    # balance the children, by flipping random cells of the larger block
+    diff = 2 * offspring.sum(axis=1, dtype=np.int64) - n
+    larger = (diff > 0).astype(np.uint8)
+    keys = rng.random((children_size, n))
+    keys[offspring != larger[:, None]] = np.inf
+    rows, cols = random_cells(keys, np.abs(diff) // 2)
+    offspring[rows, cols] ^= 1
+
+
+def random_cells(keys: np.ndarray, counts: np.ndarray):
+    """
+    select counts[i] cells in every row i, those with the smallest keys
+    :return: the row and column index of every selected cell
+    """
+    most = int(counts.max(initial=0))
+    if most == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    cols = np.argpartition(keys, most - 1, axis=1)[:, :most]
+    # order the candidates by key, so every row takes its smallest ones
+    order = np.argsort(np.take_along_axis(keys, cols, axis=1), axis=1)
+    cols = np.take_along_axis(cols, order, axis=1)
+    rows = np.broadcast_to(np.arange(len(keys))[:, None], cols.shape)
+    selected = np.arange(most) < counts[:, None]
+    return rows[selected], cols[selected]
+
+
+def local_improvement(
+    hypergraph: Hypergraph, offspring, rng=random, lookahead=0, large_net=0
+) -> Data:
+    """
+    perform one pass of KL partition on the better of the offspring
+    :param rng: random stream breaking the ties of the KL pass
+    :param lookahead: see kl_inner_loop
+    :param large_net: see init_partition
+    :return: data container of the improved offspring
     """
-    for child in offspring:
-        n = len(child)
-        # perform mutation operation
-        m = random.randint(0, n // 100)
-        for i in random.sample(range(n), m):
-            child[i] = flip(child[i])
+    # only the better child becomes a data container
+    cutsizes = calculate_cutsizes(hypergraph, np.asarray(offspring, dtype=np.uint8))
+    index = 0 if cutsizes[0] < cutsizes[1] else 1
+    data = init_partition(hypergraph, offspring[index], large_net)
+    moves = kl_inner_loop(hypergraph, data, rng=rng, lookahead=lookahead)
+    kl_inner_stop(hypergraph, data)
+    data.moves += moves
+    # only counted when the improvement runs in the process of the run
+    metrics.count("moves", moves)
+    report_counters(data)
+
+    cells_size = hypergraph.get_cells_size()
+    logging.debug(
+        "local improvement: %s moves, %.0f%% skipped, %s pin visits saved",
+        moves,
+        100 * (1 - moves / cells_size) if cells_size else 0,
+        data.saved_pin_visits,
+    )
+    return data
 
-        # balance the child
-        diff = reduce(lambda a, b: a + (1 if b == 1 else -1), child, 0)
-        block_id, diff = 1 if diff > 0 else 0, abs(diff)
 
-        for i in random.sample(range(n), n):
-            if (n % 2 == 0 and diff == 0) or (n % 2 == 1 and diff <= 1):
-                break
-            if child[i] == block_id:
-                child[i] = flip(child[i])
-                diff -= 2
+# hypergraph of the circuit, set once in every worker process
+worker_hypergraph = None
 
 
-def flip(block_id) -> int:
-    return (block_id + 1) % 2
+def init_worker(hypergraph: Hypergraph):
+    """
+    initialize a worker process of the local improvement pool
+    """
+    global worker_hypergraph
+    worker_hypergraph = hypergraph
 
 
-def local_improvement(circuit, offspring):
+def improve_offspring(task, hypergraph: Hypergraph = None):
     """
-    perform one pass of KL partition on the offspring
-    :return: data containers for offspring
+    perform the local improvement, in this process or in a worker process;
+    a data container only exists for the offspring being improved, and only
+    the compact block id arrays travel between processes
+    :param task: the offspring as uint8 block id arrays, a random seed, the
+                 lookahead of the pass and the large net threshold
+    :return: block id array, mincut and moves of the improved chromosome
     """
-    res = [init_partition(circuit, child) for child in offspring]
-    index = 0 if res[0].mincut < res[1].mincut else 1
-    kl_inner_loop(circuit, res[index], None, True)
-    return res[index]
+    offspring, seed, lookahead, large_net = task
+    offspring = [child.tolist() for child in offspring]
+    data = local_improvement(
+        hypergraph or worker_hypergraph,
+        offspring,
+        random.Random(seed),
+        lookahead,
+        large_net,
+    )
+    block_ids = np.asarray(data.get_node_block_ids(), dtype=np.uint8)
+    return block_ids, data.mincut, data.moves
 
 
-def replace(population, fitness_list, parents_index, offspring):
+def replace(population: Population, fitness_list, parents_index, block_ids, mincut):
     """
     replace some members with offsping:
         - if the offsping is better than one of the parents,
             -  repace more similar parent with the offspring
         - else, replace with the most inferior member of the population
+    :return: the member replaced, "nearer" or "farther" parent, or "inferior"
     """
-    parents = population[parents_index[0]], population[parents_index[1]]
-
-    distance0, distance1 = (
-        measure_distance(parents[0], offspring),
-        measure_distance(parents[1], offspring),
-    )
-    if offspring.mincut < parents[0 if distance0 < distance1 else 1].mincut:
-        index = parents_index[0 if distance0 < distance1 else 1]
-    elif offspring.mincut < parents[1 if distance0 < distance1 else 0].mincut:
-        index = parents_index[1 if distance0 < distance1 else 0]
+    first, second = parents_index
+    # on a tie, the second parent counts as the nearer one
+    nearer = population.nearest(block_ids, [second, first])
+    farther = first if nearer == second else second
+    if mincut < population.get_mincut(nearer):
+        index = nearer
+        replaced = "nearer"
+    elif mincut < population.get_mincut(farther):
+        index = farther
+        replaced = "farther"
     else:
         index = find_inferior(fitness_list)
-    population[index] = offspring
-
-
-def measure_distance(parent, child) -> int:
-    """
-    :return: the Hamming distance between parent and child
-    """
-    parent_block_ids, child_block_ids = (
-        parent.get_node_block_ids(),
-        child.get_node_block_ids(),
-    )
-    n = len(parent_block_ids)
-    return sum([parent_block_ids[i] != child_block_ids[i] for i in range(n)])
+        replaced = "inferior"
+    population.replace(index, block_ids, mincut)
+    return replaced
 
 
 def find_inferior(fitness_list) -> int:
@@ -0,0 +1,215 @@
+import logging
+import multiprocessing
+import queue
+import random
+import traceback
+
+import numpy as np
+
+from algorithms.genetic import genetic_loop, random_population
+from algorithms.kl import init_partition
+from algorithms.observer import Observer
+from model.circuit import Circuit
+from model.data import Data
+from model.hypergraph import Hypergraph
+from model.population import Population
+from util.trace import trace
+
+# seconds between two checks that the islands are alive, while waiting
+POLL_INTERVAL = 1.0
+
+
+class IslandError(Exception):
+    """
+    raised in the coordinator when an island fails or dies
+    """
+
+
+def island_genetic(
+    circuit: Circuit,
+    observer: Observer = None,
+    islands=4,
+    interval=10,
+    migrants=1,
+    topology="ring",
+    rng=random,
+) -> Data:
+    """
+    perform the Genetic Partition algorithm on several independent
+    populations (islands), each evolving in its own process; every interval
+    generations the best chromosomes of each island migrate to another one
+    :param islands: the number of islands / processes
+    :param interval: the number of generations between two migrations
+    :param migrants: the number of chromosomes sent by each island
+    :param topology: "ring" sends island i to i + 1, "random" to a random
+                     ring drawn again at every migration
+    :param rng: random stream of the coordinator, every island draws its own
+                seed from it
+    :return: the best chromosome over all the islands
+    """
+    observer = observer or Observer()
+    hypergraph = circuit.hypergraph
+
+    context = multiprocessing.get_context()
+    outbox = context.Queue()  # island -> coordinator, (island index, report)
+    inboxes = [context.Queue() for _ in range(islands)]  # coordinator -> island
+    processes = [
+        context.Process(
+            target=run_island,
+            args=(
+                i,
+                hypergraph,
+                rng.getrandbits(32),
+                interval,
+                migrants,
+                inboxes[i],
+                outbox,
+            ),
+            daemon=True,
+        )
+        for i in range(islands)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        epoch = 0
+        while True:
+            epoch += 1
+            reports = [None] * islands
+            for _ in range(islands):
+                index, report = receive(outbox, processes)
+                if isinstance(report, IslandError):
+                    raise report
+                reports[index] = report
+
+            # the first emigrant of every island is its best chromosome
+            bests = Population(
+                [emigrants[0][0] for _, emigrants in reports],
+                [emigrants[0][1] for _, emigrants in reports],
+            )
+            mincut = bests.get_mincut(bests.best())
+            converged = sum(1 for c, _ in reports if c)
+            logging.info(
+                "epoch {}: mincut = {} | converged islands: {}/{}".format(
+                    epoch, mincut, converged, islands
+                )
+            )
+            observer.on_generation(bests)
+            if trace.enabled:
+                trace.event(
+                    "epoch",
+                    epoch=epoch,
+                    best=mincut,
+                    mean=round(float(bests.mincuts.mean()), 3),
+                    worst=bests.get_mincut(bests.worst()),
+                    converged=converged,
+                    islands=islands,
+                )
+
+            # stop once every island has converged in the same epoch
+            stop = converged == islands
+            targets = migration_targets(islands, topology, rng)
+            for i, (_, emigrants) in enumerate(reports):
+                inboxes[targets[i]].put(None if stop else emigrants)
+            if stop:
+                block_ids = bests.get_block_ids(bests.best())
+                return init_partition(hypergraph, block_ids.tolist())
+    finally:
+        # islands return after the final message, the timeout only matters
+        # if the coordinator is interrupted while they are still evolving
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+
+def receive(outbox, processes):
+    """
+    wait for the next report of an island, checking every POLL_INTERVAL
+    seconds that none of them died without a word, e.g. killed or out of
+    memory; an island only exits on its own once told to stop
+    :return: the island index and its report
+    """
+    while True:
+        try:
+            return outbox.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            dead = [i for i, p in enumerate(processes) if p.exitcode is not None]
+            if not dead:
+                continue
+            # the last words of the island may have arrived meanwhile
+            try:
+                return outbox.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                raise IslandError(
+                    "island {} died with exit code {}".format(
+                        dead[0], processes[dead[0]].exitcode
+                    )
+                )
+
+
+def migration_targets(islands, topology, rng=random):
+    """
+    :return: the island receiving the emigrants of each island
+    """
+    order = list(range(islands))
+    if topology == "random":
+        rng.shuffle(order)
+    elif topology != "ring":
+        raise ValueError("unknown topology: {}".format(topology))
+
+    targets = [0] * islands
+    for i in range(islands):
+        targets[order[i]] = order[(i + 1) % islands]
+    return targets
+
+
+def run_island(index, hypergraph: Hypergraph, seed, interval, migrants, inbox, outbox):
+    """
+    evolve a single island in a worker process, exchanging its best
+    chromosomes with the coordinator every interval generations; only
+    compact block id arrays travel between processes; an error is sent to
+    the coordinator in place of a report
+    """
+    try:
+        evolve_island(index, hypergraph, seed, interval, migrants, inbox, outbox)
+    except Exception:
+        error = IslandError(
+            "island {} failed:\n{}".format(index, traceback.format_exc())
+        )
+        outbox.put((index, error))
+
+
+def evolve_island(
+    index, hypergraph: Hypergraph, seed, interval, migrants, inbox, outbox
+):
+    """
+    evolve a single island until the coordinator tells it to stop
+    """
+    rng = random.Random(seed)
+    population = random_population(hypergraph, rng=rng)
+
+    while True:
+        converged = False
+        for _ in range(interval):
+            converged, _ = genetic_loop(hypergraph, population, rng=rng)
+            if converged:
+                break
+
+        order = np.argsort(population.mincuts, kind="stable")[:migrants]
+        emigrants = [
+            (population.get_block_ids(i).copy(), population.get_mincut(i))
+            for i in order
+        ]
+        outbox.put((index, (converged, emigrants)))
+
+        immigrants = inbox.get()
+        if immigrants is None:
+            return
+
+        # an immigrant replaces the most inferior member, if it is better
+        for block_ids, mincut in immigrants:
+            worst = population.worst()
+            if mincut < population.get_mincut(worst):
+                population.replace(worst, block_ids, mincut)
@@ -1,111 +1,252 @@
 import logging
 import random
-from functools import reduce
 
-from model.cell import Cell
+import numpy as np
+
+from algorithms.observer import Observer
 from model.circuit import Circuit
 from model.data import Data
-from model.net import Net
+from model.hypergraph import Hypergraph
+from util.metrics import metrics
+from util.trace import trace
+
+# a bounded pass goes at least this many moves past its best cut
+MIN_LOOKAHEAD = 20
+
+
+def kl(
+    circuit: Circuit,
+    observer: Observer = None,
+    passes=6,
+    lookahead=0.0,
+    large_net=0,
+    rng=random,
+) -> Data:
+    """
+    perform the Kernighan-Lin Partition algorithm in the given circuit;
+    passes run in an explicit loop over a single data container, so memory
+    stays fixed no matter how many passes are allowed
+    :param lookahead: bound the passes, see lookahead_moves; 0 for full passes
+    :param large_net: nets with more pins are left out of the gains, 0 to
+                      keep every net
+    :param rng: random stream of the initial partition and the tie-breaks,
+                a random.Random for reproducible runs
+    :return: data container holding the best partition found
+    """
+    observer = observer or Observer()
+    hypergraph = circuit.hypergraph
+    data = init_partition(hypergraph, large_net=large_net, rng=rng)
+    observer.on_pass(data)
+
+    lookahead = lookahead_moves(hypergraph.get_cells_size(), lookahead)
+    return kl_outer_loop(
+        hypergraph, data, observer, passes, lookahead=lookahead, rng=rng
+    )
 
 
-def kl(circuit: Circuit, app=None):
+def report_large_nets(data: Data):
     """
-    perform the Kernighan-Lin Partition algorithm in the given circuit
+    log the number of nets left out of the gains, and the pin visits saved
     """
-    data = init_partition(circuit)
-
-    if app is not None:
-        app.update_canvas(data)
-        app.root.after(100, kl_inner_loop, circuit, data, app)
-    else:
-        kl_inner_loop(circuit, data)
+    large_nets = data.get_large_nets().count(1)
+    if large_nets:
+        logging.info(
+            "large nets: {}, pin visits saved: {}".format(
+                large_nets, data.saved_pin_visits
+            )
+        )
 
 
-def kl_inner_loop(circuit: Circuit, data: Data, app=None, genetic=False):
+def report_counters(data: Data):
     """
-    perform the inner loop of the Kernighan-Lin Partition algorithm
+    hand the work counted by the data container to the metrics of the run
     """
-    # select the max gain node from blocks
-    max_gain_node = select_max_gain_node(data)
+    metrics.count("pin_visits", data.pin_visits)
+    metrics.count("gain_updates", data.gain_updates)
+    metrics.count("bucket_scans", data.get_bucket_scans())
 
-    # move the max gain node to another block
-    #   - update the gain for each node
-    #   - update the nets distribution
-    #   - update the cutsize
-    move_node_another_block(max_gain_node, data)
 
-    # if cutsize is the minimum for this pass, store the cut
-    if data.cutsize < data.mincut:
-        data.store_best_cut()
+def lookahead_moves(cells_size, fraction) -> int:
+    """
+    :param fraction: the lookahead, as a fraction of the cells
+    :return: the number of consecutive moves without a better cut after
+             which a pass stops, at least MIN_LOOKAHEAD; 0, for full
+             passes, if the fraction is 0
+    """
+    if fraction <= 0:
+        return 0
+    return max(MIN_LOOKAHEAD, int(fraction * cells_size))
+
+
+def kl_outer_loop(
+    hypergraph: Hypergraph,
+    data: Data,
+    observer: Observer = None,
+    passes=6,
+    select=None,
+    lookahead=0,
+    rng=random,
+) -> Data:
+    """
+    perform the outer loop of the Kernighan-Lin Partition algorithm, starting
+    from the partition in data
+    :param select: the move selection of the passes, select_max_gain_node
+                   by default
+    :param lookahead: see kl_inner_loop
+    :param rng: see kl_inner_loop
+    :return: data container holding the best partition found
+    """
+    observer = observer or Observer()
+    cells_size = hypergraph.get_cells_size()
+
+    # continue for up to `passes` iterations or until mincut stops improving
+    while True:
+        with metrics.timer("pass"):
+            moves = kl_inner_loop(
+                hypergraph, data, observer, rng, select=select, lookahead=lookahead
+            )
+        with metrics.timer("restore"):
+            undone = kl_inner_stop(hypergraph, data)
+        data.moves += moves
+        metrics.count("moves", moves)
+        metrics.count("passes")
+        if trace.enabled:
+            trace.event(
+                "pass",
+                iteration=data.iteration,
+                cutsize=data.cutsize,
+                moves=moves,
+                best_prefix=moves - undone,
+                cells=cells_size,
+            )
+
+        logging.info(
+            "iteration {}: best mincut = {} | moves: {}, {:.0%} skipped".format(
+                data.iteration,
+                data.cutsize,
+                moves,
+                1 - moves / cells_size if cells_size else 0,
+            )
+        )
+        observer.on_pass(data)
+
+        if data.iteration >= passes or data.mincut == data.prev_mincut:
+            report_large_nets(data)
+            report_counters(data)
+            return data
+        data.prev_mincut = data.mincut
+        data.iteration += 1
 
-    data.print_blocks_size()
 
-    if app is None or app.quick:
-        if data.has_unlocked_nodes():
-            kl_inner_loop(circuit, data, app, genetic)
+def kl_inner_loop(
+    hypergraph: Hypergraph,
+    data: Data,
+    observer: Observer = None,
+    rng=random,
+    select=None,
+    lookahead=0,
+) -> int:
+    """
+    perform the inner loop (a single pass) of the Kernighan-Lin Partition
+    algorithm, moving nodes until no unlocked nodes remains
+    :param rng: random stream breaking the ties between the blocks
+    :param select: chooses the node to move, or -1 to end the pass early,
+                   select_max_gain_node by default
+    :param lookahead: end the pass early after this many consecutive moves
+                      without a better cut, 0 to move every node
+    :return: the number of moves of the pass
+    """
+    watch = observer is not None and observer.watch_moves
+    # checked once, so the block sizes are only read when they are logged
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+    select = select or select_max_gain_node
+    _, _, cell_ptr, cell_nets = hypergraph.as_lists()
+
+    moves = stall = 0  # moves since the best cut of the pass
+    while data.has_unlocked_nodes():
+        # select the max gain node from blocks
+        max_gain_node = select(data, rng)
+        if max_gain_node < 0:
+            break
+
+        # move the max gain node to another block
+        #   - update the gain for each node
+        #   - update the nets distribution
+        #   - update the cutsize
+        nets = cell_nets[cell_ptr[max_gain_node] : cell_ptr[max_gain_node + 1]]
+        move_node_another_block(hypergraph, max_gain_node, nets, data)
+
+        # if cutsize is the minimum for this pass, store the cut
+        moves += 1
+        if data.cutsize < data.mincut:
+            data.store_best_cut()
+            stall = 0
         else:
-            kl_inner_stop(circuit, data, app, genetic)
-    else:
-        app.update_canvas(data)
-        # inner loop stop until no unlocked nodes remains
-        if data.has_unlocked_nodes():
-            app.root.after(1, kl_inner_loop, circuit, data, app, genetic)
-        else:  # inner loop exit
-            app.root.after(1000, kl_inner_stop, circuit, data, app, genetic)
+            stall += 1
 
+        if debug:
+            data.print_blocks_size()
 
-def kl_inner_stop(circuit: Circuit, data: Data, app=None, genetic=False):
-    """
-    it is the end of the current pass, restore the best cut of this pass;
-    terminates the outer loop if mincut doesn't improve or it reaches 6 iterations
-    """
-    data.restore_best_cut()  # restore block data structures
+        if watch:
+            observer.on_move(data)
 
-    # update the distribution for the restored best cut
-    update_distribution(circuit, data)
-    # update the gains for the restored best cut
-    calculate_gains(circuit, data)
+        if lookahead and stall == lookahead:
+            break
 
-    if genetic:
-        return
+    return moves
 
-    logging.info("iteration {}: best mincut = {}".format(data.iteration, data.cutsize))
 
-    if app is not None:
-        app.update_canvas(data)
-    data.iteration += 1
+def kl_inner_stop(hypergraph: Hypergraph, data: Data) -> int:
+    """
+    it is the end of the current pass, restore the best cut of this pass by
+    undoing the moves made after it; distributions and gains are updated
+    move by move instead of being recalculated for the whole circuit
+    :return: the number of moves undone
+    """
+    _, _, cell_ptr, cell_nets = hypergraph.as_lists()
 
-    # continue for up to 6 iterations or until mincut stops improving
-    if data.iteration <= 6 and data.mincut != data.prev_mincut:
-        data.prev_mincut = data.mincut
-        if app is not None:
-            app.root.after(1000, kl_inner_loop, circuit, data, app)
-    elif app is not None:
-        app.update_partition_button(True)
+    moves = data.pop_moves_after_best_cut()
+    for cid in moves:
+        F = data.get_node_block_id(cid)  # the block the node was moved to
+        T = (F + 1) % 2  # the block the node comes back to
+        data.move_locked_node(cid, T)
+        nets = cell_nets[cell_ptr[cid] : cell_ptr[cid + 1]]
+        update_gains_by_move(hypergraph, cid, nets, F, T, data)
 
+    data.restore_best_cut()  # unlock the nodes in their restored blocks
+    return len(moves)
 
-def init_partition(circuit, block_ids=None) -> Data:
+
+def init_partition(
+    hypergraph: Hypergraph, block_ids=None, large_net=0, rng=random
+) -> Data:
     """
     randomly partition the nodes equally, if the block_ids
     is not specified.
+    :param large_net: nets with more pins are left out of the gains, 0 to
+                      keep every net
+    :param rng: random stream of the random partition
     :return: data container for the current partition
     """
-    pmax = get_pmax(circuit)
-    nets_size = circuit.get_nets_size()
-    n = circuit.get_cells_size()
+    pmax = hypergraph.get_pmax()
+    nets_size = hypergraph.get_nets_size()
+    n = hypergraph.get_cells_size()
 
     if block_ids is None:
-        random_cids = random.sample(range(n), n)
+        random_cids = rng.sample(range(n), n)
         block_ids = [cid % 2 for i, cid in enumerate(random_cids)]
 
-    # initialize a data container for the current partition
-    data = Data(pmax, nets_size, block_ids)
-    # update the nets distribution in the current partition
-    update_distribution(circuit, data)
-    # update the gain for each node in the current partition
-    calculate_gains(circuit, data)
-    # update the cutsize of the current partition
-    data.cutsize = calculate_cutsize(circuit, data)
+    with metrics.timer("init"):
+        # initialize a data container for the current partition
+        data = Data(pmax, nets_size, block_ids, hypergraph.cell_weights.tolist())
+        if large_net > 0:
+            data.set_large_nets(hypergraph.net_sizes() > large_net)
+        # update the nets distribution in the current partition
+        update_distribution(hypergraph, data)
+        # update the gain for each node in the current partition
+        calculate_gains(hypergraph, data)
+        # update the cutsize of the current partition
+        data.cutsize = calculate_cutsize(hypergraph, data)
 
     logging.info("initial cutsize = {}".format(data.cutsize))
 
@@ -116,12 +257,20 @@ def init_partition(circuit, block_ids=None) -> Data:
     return data
 
 
-def select_max_gain_node(data: Data):
+def select_max_gain_node(data: Data, rng=random) -> int:
     """
     choose max gain node from blocks, and maintain the balance constraint
+    by moving out of the heavier block
+    :return: the id of the chosen node
     """
-    block0_size, block0_max_gain = data.get_block_size(0), data.peek_block_max_gain(0)
-    block1_size, block1_max_gain = data.get_block_size(1), data.peek_block_max_gain(1)
+    # with weighted cells, the heavier block may run out of unlocked nodes first
+    if not data.block_has_unlocked_nodes(0):
+        return data.pop_block_max_gain(1)
+    if not data.block_has_unlocked_nodes(1):
+        return data.pop_block_max_gain(0)
+
+    block0_size, block0_max_gain = data.get_block_weight(0), data.peek_block_max_gain(0)
+    block1_size, block1_max_gain = data.get_block_weight(1), data.peek_block_max_gain(1)
 
     if block0_size > block1_size or (
         block0_size == block1_size and block0_max_gain > block1_max_gain
@@ -132,92 +281,202 @@ def select_max_gain_node(data: Data):
     ):
         return data.pop_block_max_gain(1)
     else:  # break tie
-        return data.pop_block_max_gain(random.choice([0, 1]))
+        return data.pop_block_max_gain(rng.choice([0, 1]))
 
 
-def move_node_another_block(cell: Cell, data: Data):
+def move_node_another_block(hypergraph: Hypergraph, cid: int, nets, data: Data):
     """
     move the max gain node to another block
+    :param nets: the ids of the nets connected to the node
     """
-    F = data.get_node_block_id(cell)  # from block id
+    F = data.get_node_block_id(cid)  # from block id
     T = (F + 1) % 2  # to block id
 
     # lock the node
-    data.lock_node(cell, T)
+    data.lock_node(cid, T)
+
+    update_gains_by_move(hypergraph, cid, nets, F, T, data)
+
+
+def update_gains_by_move(hypergraph: Hypergraph, cid: int, nets, F, T, data: Data):
+    """
+    update the nets distribution, the gains and the cutsize after the node
+    moved from block F to block T; the gains of locked nodes are kept exact
+    as well, so that any move can be undone incrementally. the cells of
+    large nets are never visited: those nets are not in the gains, and only
+    their cut state is applied to the cutsize
+    :param nets: the ids of the nets connected to the node
+    """
+    net_ptr, net_pins, _, _ = hypergraph.as_lists()
+    # bind the partition arrays once, the loops below only read and write them
+    large_nets = data.get_large_nets()
+    locked = data.get_nodes_locked()
+    block_ids = data.get_node_block_ids()
+    gains = data.get_nodes_gain()
+    distribution = data.get_nets_distribution()
+    update_node_gain = data.update_node_gain
+    from_distribution, to_distribution = distribution[F], distribution[T]
+    # the cells of the critical nets visited, and the gains they changed
+    visits = updates = 0
+
+    for net in nets:
+        if large_nets[net]:
+            move_large_net(net, net_ptr[net + 1] - net_ptr[net], F, T, data)
+            continue
+
+        cells = net_pins[net_ptr[net] : net_ptr[net + 1]]
 
-    for net in cell.nets:
         # check critical nets before the move
-        if data.get_net_distribution(net, T) == 0:
-            for nei in net.cells:
-                if data.is_node_unlocked(nei):
-                    data.update_node_gain(nei, 1)
-        elif data.get_net_distribution(net, T) == 1:
-            for nei in net.cells:
-                if data.is_node_unlocked(nei) and data.get_node_block_id(nei) == T:
-                    data.update_node_gain(nei, -1)
+        if to_distribution[net] == 0:
+            visits += len(cells)
+            updates += len(cells) - 1
+            for nei in cells:
+                if nei != cid:
+                    if locked[nei]:
+                        gains[nei] += 1
+                    else:
+                        update_node_gain(nei, 1)
+        elif to_distribution[net] == 1:
+            visits += len(cells)
+            updates += 1  # the single cell of the net in T
+            for nei in cells:
+                if block_ids[nei] == T and nei != cid:
+                    if locked[nei]:
+                        gains[nei] -= 1
+                    else:
+                        update_node_gain(nei, -1)
 
         # change the net distribution to reflect the move
-        data.dec_net_distribution(net, F)
-        data.inc_net_distribution(net, T)
+        from_distribution[net] -= 1
+        to_distribution[net] += 1
 
         # check the critical nets after the move
-        if data.get_net_distribution(net, F) == 0:
-            for nei in net.cells:
-                if data.is_node_unlocked(nei):
-                    data.update_node_gain(nei, -1)
-        elif data.get_net_distribution(net, F) == 1:
-            for nei in net.cells:
-                if data.is_node_unlocked(nei) and data.get_node_block_id(nei) == F:
-                    data.update_node_gain(nei, 1)
+        if from_distribution[net] == 0:
+            visits += len(cells)
+            updates += len(cells) - 1
+            for nei in cells:
+                if nei != cid:
+                    if locked[nei]:
+                        gains[nei] -= 1
+                    else:
+                        update_node_gain(nei, -1)
+        elif from_distribution[net] == 1:
+            visits += len(cells)
+            updates += 1  # the single cell of the net left in F
+            for nei in cells:
+                if block_ids[nei] == F:
+                    if locked[nei]:
+                        gains[nei] += 1
+                    else:
+                        update_node_gain(nei, 1)
+
+    data.pin_visits += visits
+    data.gain_updates += updates
+    data.update_cutsize_by_gain(cid)
+    # moving the node back would exactly revert the cutsize change
+    gains[cid] = -gains[cid]
+
+
+def move_large_net(net, size, F, T, data: Data):
+    """
+    update the distribution of a large net and the cutsize, after one of its
+    cells moved from block F to block T, and count the pin visits the gain
+    updates of the net would have made
+    :param size: the number of pins of the net
+    """
+    distribution = data.get_nets_distribution()
+    from_distribution, to_distribution = distribution[F], distribution[T]
+    # the net is critical once before the move if T has at most one of its
+    # cells, and once after it if F is left with at most one
+    critical = (to_distribution[net] <= 1) + (from_distribution[net] <= 2)
+    data.saved_pin_visits += critical * size
 
-    data.update_cutsize_by_gain(cell)
+    cut = to_distribution[net] > 0
+    from_distribution[net] -= 1
+    to_distribution[net] += 1
+    data.cutsize += (from_distribution[net] > 0) - cut
 
 
-def update_distribution(circuit: Circuit, data: Data):
+def nets_distribution(hypergraph: Hypergraph, block_ids) -> np.ndarray:
+    """
+    :return: 2 x nets matrix, the number of cells of each net in each block
+    """
+    pin_blocks = np.asarray(block_ids, dtype=np.int32)[hypergraph.net_pins]
+    nets_size = hypergraph.get_nets_size()
+    pin_nets = hypergraph.pin_nets()
+    block1 = np.bincount(pin_nets, weights=pin_blocks, minlength=nets_size)
+    block0 = hypergraph.net_sizes() - block1
+    return np.stack([block0, block1]).astype(np.int32)
+
+
+def update_distribution(hypergraph: Hypergraph, data: Data):
     """
     update the distribution for each net
     """
-    for net in circuit.nets:
-        data.reset_net_distribution(net)
-        for cell in net.cells:
-            block_id = data.get_node_block_id(cell)
-            data.inc_net_distribution(net, block_id)
+    distribution = nets_distribution(hypergraph, data.get_node_block_ids())
+    data.set_nets_distribution(distribution[0].tolist(), distribution[1].tolist())
 
 
-def calculate_gains(circuit: Circuit, data: Data):
+def calculate_gains(hypergraph: Hypergraph, data: Data):
     """
     calculate the gain for each node
     """
-    for cell in circuit.cells:
-        data.reset_node_gain(cell)
-        F = data.get_node_block_id(cell)  # from block id
-        T = (F + 1) % 2  # to block id
-        for net in cell.nets:
-            if data.get_net_distribution(net, F) == 1:
-                data.inc_node_gain(cell)
-            if data.get_net_distribution(net, T) == 0:
-                data.dec_node_gain(cell)
-        data.unlock_node(cell, F)
+    n = hypergraph.get_cells_size()
+    block_ids = np.asarray(data.get_node_block_ids(), dtype=np.int32)
+    distribution = nets_distribution(hypergraph, block_ids)
+
+    # from / to block id of the owner cell of each (cell, net) entry
+    owners = np.repeat(np.arange(n, dtype=np.int32), hypergraph.cell_degrees())
+    F = block_ids[owners]
+    T = 1 - F
+    nets = hypergraph.cell_nets
+    # a net is critical if the cell is alone in its block, or if no cell of
+    # the net is in the other block
+    adjust = (distribution[F, nets] == 1).astype(np.int32) - (
+        distribution[T, nets] == 0
+    )
+    adjust[np.frombuffer(data.get_large_nets(), dtype=bool)[nets]] = 0
+    gains = np.bincount(owners, weights=adjust, minlength=n).astype(np.int32)
 
+    data.set_nodes_gain(gains.tolist())
+    for cid, F in enumerate(block_ids.tolist()):
+        data.unlock_node(cid, F)
 
-def calculate_cutsize(circuit: Circuit, data: Data):
+
+def calculate_cutsize(hypergraph: Hypergraph, data: Data) -> int:
     """
     :return: the cutsize fo the current partition
     """
-    return reduce(lambda a, b: a + is_cut(b, data), circuit.nets, 0)
+    distribution = nets_distribution(hypergraph, data.get_node_block_ids())
+    return int(np.count_nonzero(is_cut(distribution)))
 
 
-def is_cut(net: Net, data: Data) -> bool:
+def calculate_cutsizes(hypergraph: Hypergraph, chromosomes: np.ndarray) -> np.ndarray:
     """
-    :return: True if the given net is a cut, otherwiese False
+    calculate the cutsize of many partitions at once, without building
+    their data containers
+    :param chromosomes: k x n matrix, the block id of every cell per partition
+    :return: the cutsize of every partition
     """
-    return (data.get_net_distribution(net, 0) > 0) and (
-        data.get_net_distribution(net, 1) > 0
-    )
-
-
-def get_pmax(circuit: Circuit) -> int:
+    net_ptr = hypergraph.net_ptr
+    net_sizes = hypergraph.net_sizes()
+    pins_size = len(hypergraph.net_pins)
+    cutsizes = np.empty(len(chromosomes), dtype=np.int64)
+    # bound the temporary k x pins matrices to a few million entries
+    step = max(1, (1 << 22) // max(1, pins_size))
+    for start in range(0, len(chromosomes), step):
+        pins = chromosomes[start : start + step, hypergraph.net_pins]
+        # prefix sums give the number of pins in block 1 of every net
+        counts = np.zeros((len(pins), pins_size + 1), dtype=np.int32)
+        np.cumsum(pins, axis=1, out=counts[:, 1:])
+        block1 = counts[:, net_ptr[1:]] - counts[:, net_ptr[:-1]]
+        cut = (block1 > 0) & (block1 < net_sizes)
+        cutsizes[start : start + step] = np.count_nonzero(cut, axis=1)
+    return cutsizes
+
+
+def is_cut(distribution) -> np.ndarray:
     """
-    :return: pmax, which is the maximum net size
+    :return: True for every net with cells in both blocks, otherwiese False
     """
-    return reduce(lambda a, b: max(a, b.get_nets_size()), circuit.cells, 0)
+    return (distribution[0] > 0) & (distribution[1] > 0)
@@ -0,0 +1,433 @@
+import logging
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+
+from algorithms.fm import fm
+from algorithms.kl import kl
+from algorithms.multilevel import multilevel
+from algorithms.observer import Observer
+from model.circuit import Circuit
+from model.hypergraph import Hypergraph
+from model.kway_data import KwayData
+from util.trace import trace
+
+BISECTIONS = {"kl": kl, "fm": fm, "multilevel": multilevel}
+
+# cut: the number of nets with cells in more than one block
+# km1: the sum over the nets of the number of blocks they span, minus one
+OBJECTIVES = ("cut", "km1")
+
+
+def kway(
+    circuit: Circuit,
+    observer: Observer = None,
+    k=4,
+    objective="cut",
+    initial="recursive",
+    bisection="kl",
+    workers=0,
+    passes=6,
+    imbalance=0.1,
+    rng=random,
+) -> KwayData:
+    """
+    partition the circuit into k blocks: an initial partition, by recursive
+    bisection or at random, is refined by direct k-way FM passes
+    :param k: the number of blocks, a power of 2 for recursive bisection
+    :param objective: "cut" or "km1", see OBJECTIVES
+    :param initial: "recursive" bisection, or a "random" partition
+    :param bisection: the 2-way algorithm of the recursive bisection
+    :param workers: the number of processes running the bisections of a
+                    level, 0 to run them in this process
+    :param passes: the maximum number of k-way FM passes, 0 to keep the
+                   initial partition
+    :param imbalance: a block may weigh up to (1 + imbalance) / k of the
+                      total weight
+    :param rng: random stream of the initial partition, every bisection
+                draws its own seed from it
+    :return: data container holding the best partition found
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError("unknown objective: {}".format(objective))
+    observer = observer or Observer()
+    hypergraph = circuit.hypergraph
+
+    if initial == "recursive":
+        block_ids = recursive_bisection(
+            hypergraph, k, objective, bisection, workers, rng
+        )
+    elif initial == "random":
+        n = hypergraph.get_cells_size()
+        block_ids = [cid % k for cid in rng.sample(range(n), n)]
+    else:
+        raise ValueError("unknown initial partition: {}".format(initial))
+
+    data = init_kway_partition(hypergraph, k, block_ids, objective)
+    observer.on_pass(data)
+    if passes == 0:
+        return data
+
+    limit = balance_limit(hypergraph, k, imbalance)
+    # continue for up to `passes` iterations or until mincut stops improving
+    while True:
+        moves = kway_inner_loop(hypergraph, data, limit, objective)
+        undone = kway_inner_stop(hypergraph, data)
+        if trace.enabled:
+            trace.event(
+                "pass",
+                iteration=data.iteration,
+                cutsize=data.cutsize,
+                moves=moves,
+                best_prefix=moves - undone,
+                cells=hypergraph.get_cells_size(),
+                k=k,
+            )
+
+        logging.info(
+            "iteration {}: best {} = {}".format(data.iteration, objective, data.cutsize)
+        )
+        observer.on_pass(data)
+
+        if data.iteration >= passes or data.mincut == data.prev_mincut:
+            return data
+        data.prev_mincut = data.mincut
+        data.iteration += 1
+
+
+def recursive_bisection(
+    hypergraph: Hypergraph, k, objective="cut", bisection="kl", workers=0, rng=random
+) -> List[int]:
+    """
+    split the circuit in two with a 2-way algorithm, then split both halves
+    again, until there are k blocks; the bisections of a level are
+    independent sub-problems, run on a pool of processes with workers
+    :return: the block id of every cell
+    """
+    n = hypergraph.get_cells_size()
+    if k < 2 or k & (k - 1):
+        raise ValueError("k must be a power of 2, got {}".format(k))
+    if k > n:
+        raise ValueError("cannot split {} cells into {} blocks".format(n, k))
+
+    # the cells of every part, and the hypergraph they induce
+    parts = [(np.arange(n), hypergraph)]
+    executor = ProcessPoolExecutor(workers) if workers > 0 else None
+    try:
+        while len(parts) < k:
+            # every bisection gets its own random stream, so the partition
+            # does not depend on the number of workers
+            tasks = [(sub, bisection, rng.getrandbits(32)) for _, sub in parts]
+            if executor is None:
+                results = [bisect_part(task) for task in tasks]
+            else:
+                results = executor.map(bisect_part, tasks)
+
+            parts = [
+                (cells[sides == side], induce(sub, sides, side, objective))
+                for (cells, sub), sides in zip(parts, results)
+                for side in (0, 1)
+            ]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    block_ids = np.empty(n, dtype=np.int32)
+    for block_id, (cells, _) in enumerate(parts):
+        block_ids[cells] = block_id
+    return block_ids.tolist()
+
+
+def bisect_part(task) -> np.ndarray:
+    """
+    split a hypergraph in two, in this process or in a worker process
+    :param task: the hypergraph, the name of the 2-way algorithm and a seed
+    :return: the side of every cell
+    """
+    hypergraph, bisection, seed = task
+    data = BISECTIONS[bisection](Circuit(hypergraph), rng=random.Random(seed))
+    return np.asarray(data.get_node_block_ids(), dtype=np.uint8)
+
+
+def induce(hypergraph: Hypergraph, sides, side, objective) -> Hypergraph:
+    """
+    :return: the hypergraph of the cells on the given side; with the cut
+             objective the nets already cut are dropped, as they cannot add
+             to it any more, and nets left with a single pin are dropped
+    """
+    cells = np.flatnonzero(sides == side)
+    index = np.full(len(sides), -1, dtype=np.int32)
+    index[cells] = np.arange(len(cells), dtype=np.int32)
+
+    nets = hypergraph.pin_nets()
+    inside = sides[hypergraph.net_pins] == side
+    if objective == "cut":
+        inside_pins = np.bincount(nets[inside], minlength=hypergraph.get_nets_size())
+        inside &= (inside_pins == hypergraph.net_sizes())[nets]
+    pins, nets = index[hypergraph.net_pins[inside]], nets[inside]
+
+    sizes = np.bincount(nets, minlength=hypergraph.get_nets_size())
+    kept_nets = sizes >= 2
+    pins = pins[kept_nets[nets]]
+    net_ptr = np.zeros(np.count_nonzero(kept_nets) + 1, dtype=np.int32)
+    np.cumsum(sizes[kept_nets], out=net_ptr[1:])
+    return Hypergraph(len(cells), net_ptr, pins, hypergraph.cell_weights[cells])
+
+
+def balance_limit(hypergraph: Hypergraph, k, imbalance) -> int:
+    """
+    :return: the max weight of a block, at least the weight of the lightest
+             even share plus the heaviest cell, so that a balanced partition
+             can always move
+    """
+    weights = hypergraph.cell_weights
+    total = int(weights.sum())
+    return max(int((1 + imbalance) * total / k), total // k + int(weights.max()))
+
+
+def kway_cutsize(hypergraph: Hypergraph, block_ids, k, objective="cut") -> int:
+    """
+    :return: the objective of the given k-way partition
+    """
+    distribution = nets_distribution(hypergraph, block_ids, k)
+    return objective_value(np.count_nonzero(distribution, axis=1), objective)
+
+
+def nets_distribution(hypergraph: Hypergraph, block_ids, k) -> np.ndarray:
+    """
+    :return: nets x k array, the number of cells of each net in each block
+    """
+    nets_size = hypergraph.get_nets_size()
+    pin_blocks = np.asarray(block_ids)[hypergraph.net_pins]
+    counts = np.bincount(
+        hypergraph.pin_nets() * k + pin_blocks, minlength=nets_size * k
+    )
+    return counts.reshape(nets_size, k)
+
+
+def objective_value(connectivity: np.ndarray, objective) -> int:
+    """
+    :param connectivity: the number of blocks each net spans
+    :return: the objective of the partition
+    """
+    if objective == "km1":
+        return int(np.maximum(connectivity - 1, 0).sum())
+    return int(np.count_nonzero(connectivity > 1))
+
+
+def init_kway_partition(hypergraph: Hypergraph, k, block_ids, objective) -> KwayData:
+    """
+    :return: data container for the given k-way partition
+    """
+    data = KwayData(
+        k,
+        hypergraph.get_pmax(),
+        hypergraph.get_nets_size(),
+        block_ids,
+        hypergraph.cell_weights.tolist(),
+    )
+    for cid in range(len(block_ids)):
+        data.add_node(cid)
+
+    distribution = nets_distribution(hypergraph, block_ids, k)
+    connectivity = np.count_nonzero(distribution, axis=1)
+    data.get_nets_distribution()[:] = distribution.ravel().tolist()
+    data.get_nets_connectivity()[:] = connectivity.tolist()
+    data.cutsize = objective_value(connectivity, objective)
+
+    logging.info("initial {} = {}".format(objective, data.cutsize))
+
+    # intialize best partition, and prev mincut
+    data.store_best_cut()
+    data.prev_mincut = data.mincut
+    return data
+
+
+def kway_inner_loop(hypergraph: Hypergraph, data: KwayData, limit, objective) -> int:
+    """
+    perform a single k-way FM pass: move the cell of best legal move, out of
+    all the blocks, until no unlocked cell has a legal move left
+    :param limit: the max weight of a block
+    :return: the number of moves of the pass
+    """
+    net_ptr, net_pins, cell_ptr, cell_nets = hypergraph.as_lists()
+    k = data.k
+    locked = data.get_nodes_locked()
+    gains = data.get_nodes_gain()
+    distribution = data.get_nets_distribution()
+    connectivity = data.get_nets_connectivity()
+    cells_size = len(locked)
+
+    # the best move of every cell, then every cell joins the buckets
+    block_weights = data.get_block_weights()
+    for cid in range(cells_size):
+        data.set_node_move(
+            cid, *best_move(hypergraph, data, cid, limit, block_weights, objective)
+        )
+    data.reset_blocks()
+    for cid in range(cells_size):
+        data.unlock_node(cid)
+
+    stamps = [-1] * cells_size  # the last move each cell was updated for
+    move = 0
+    while True:
+        cid = select_kway_move(hypergraph, data, limit, objective)
+        if cid < 0:
+            break
+        gain = gains[cid]
+        F, T = data.move_node(cid)
+        move += 1
+
+        # only the nets whose pins in F or T cross the values the gains
+        # depend on change the gains of their cells
+        touched = []
+        for net in cell_nets[cell_ptr[cid] : cell_ptr[cid + 1]]:
+            base = net * k
+            distribution[base + F] -= 1
+            distribution[base + T] += 1
+            in_F, in_T = distribution[base + F], distribution[base + T]
+            if in_F == 0:
+                connectivity[net] -= 1
+            if in_T == 1:
+                connectivity[net] += 1
+            if in_F <= 1 or in_T <= 2:
+                for nei in net_pins[net_ptr[net] : net_ptr[net + 1]]:
+                    if not locked[nei] and stamps[nei] != move:
+                        stamps[nei] = move
+                        touched.append(nei)
+        data.cutsize -= gain
+
+        block_weights = data.get_block_weights()
+        for nei in touched:
+            data.set_node_move(
+                nei, *best_move(hypergraph, data, nei, limit, block_weights, objective)
+            )
+
+        # if cutsize is the minimum for this pass, store the cut
+        if data.cutsize < data.mincut:
+            data.store_best_cut()
+
+    return move
+
+
+def kway_inner_stop(hypergraph: Hypergraph, data: KwayData) -> int:
+    """
+    it is the end of the current pass, restore the best cut of this pass by
+    undoing the moves made after it
+    :return: the number of moves undone
+    """
+    _, _, cell_ptr, cell_nets = hypergraph.as_lists()
+    k = data.k
+    block_ids = data.get_node_block_ids()
+    distribution = data.get_nets_distribution()
+    connectivity = data.get_nets_connectivity()
+
+    moves = data.pop_moves_after_best_cut()
+    for cid, T in moves:
+        F = block_ids[cid]  # the block the node was moved to
+        data.move_locked_node(cid, T)
+        for net in cell_nets[cell_ptr[cid] : cell_ptr[cid + 1]]:
+            base = net * k
+            distribution[base + F] -= 1
+            if distribution[base + F] == 0:
+                connectivity[net] -= 1
+            distribution[base + T] += 1
+            if distribution[base + T] == 1:
+                connectivity[net] += 1
+
+    data.restore_best_cut()
+    return len(moves)
+
+
+def select_kway_move(hypergraph: Hypergraph, data: KwayData, limit, objective) -> int:
+    """
+    choose the max gain node over the blocks, breaking ties by moving out of
+    the heavier block; a node whose target block filled up since its gain
+    was calculated gets a new best move, or is parked if it has no legal one
+    :return: the id of the chosen node, or -1 if no move is legal
+    """
+    gains = data.get_nodes_gain()
+    targets = data.get_nodes_target()
+    weights = data.get_nodes_weight()
+    block_weights = data.get_block_weights()
+
+    while True:
+        best, best_gain, best_weight = -1, 0, 0
+        for block_id in range(data.k):
+            if not data.block_has_unlocked_nodes(block_id):
+                continue
+            cid = data.peek_block_max_gain_node(block_id)
+            gain, weight = gains[cid], block_weights[block_id]
+            if (
+                best < 0
+                or gain > best_gain
+                or (gain == best_gain and weight > best_weight)
+            ):
+                best, best_gain, best_weight = cid, gain, weight
+
+        if best < 0:
+            return -1
+        if block_weights[targets[best]] + weights[best] <= limit:
+            return best
+
+        gain, target = best_move(
+            hypergraph, data, best, limit, block_weights, objective
+        )
+        if block_weights[target] + weights[best] <= limit:
+            data.set_node_move(best, gain, target)
+        else:
+            data.park_node(best)
+
+
+def best_move(
+    hypergraph: Hypergraph, data: KwayData, cid, limit, block_weights, objective
+):
+    """
+    calculate the gain of moving the cell to every other block, and choose
+    the best legal one, the lightest block on ties
+    :return: the gain of the best move, and its target block; the best move
+             overall if no move is legal
+    """
+    _, _, cell_ptr, cell_nets = hypergraph.as_lists()
+    k = data.k
+    F = data.get_node_block_ids()[cid]
+    distribution = data.get_nets_distribution()
+    connectivity = data.get_nets_connectivity()
+
+    base_gain, gains = 0, [0] * k
+    for net in cell_nets[cell_ptr[cid] : cell_ptr[cid + 1]]:
+        base = net * k
+        alone = distribution[base + F] == 1  # the cell leaves the block of the net
+        if objective == "km1":
+            # the net spans one block less if the cell is alone in F, and
+            # one more unless the target block has cells of the net
+            base_gain += alone - 1
+            for block_id in range(k):
+                if distribution[base + block_id]:
+                    gains[block_id] += 1
+        elif connectivity[net] == 1:
+            # the net becomes cut, unless the cell is its only pin
+            base_gain -= not alone
+        elif connectivity[net] == 2 and alone:
+            # the net is no longer cut, if the cell joins the other block
+            for block_id in range(k):
+                if block_id != F and distribution[base + block_id]:
+                    gains[block_id] += 1
+
+    weight = data.get_nodes_weight()[cid]
+    best, best_legal = None, None
+    for block_id in range(k):
+        if block_id == F:
+            continue
+        key = (gains[block_id], -block_weights[block_id])
+        if best is None or key > best[0]:
+            best = key, block_id
+        if block_weights[block_id] + weight <= limit and (
+            best_legal is None or key > best_legal[0]
+        ):
+            best_legal = key, block_id
+
+    (gain, _), target = best_legal or best
+    return base_gain + gain, target
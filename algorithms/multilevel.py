@@ -0,0 +1,216 @@
+import logging
+import random
+from typing import List
+
+import numpy as np
+
+from algorithms.genetic import genetic
+from algorithms.kl import (
+    init_partition,
+    kl,
+    kl_inner_stop,
+    kl_outer_loop,
+    lookahead_moves,
+    move_node_another_block,
+)
+from algorithms.observer import Observer
+from model.circuit import Circuit
+from model.data import Data
+from model.hypergraph import Hypergraph
+
+INITIAL_PARTITIONERS = {"kl": kl, "genetic": genetic}
+
+
+def multilevel(
+    circuit: Circuit,
+    observer: Observer = None,
+    initial="kl",
+    coarsest=200,
+    passes=6,
+    match_net_limit=50,
+    lookahead=0.0,
+    large_net=0,
+    rng=random,
+) -> Data:
+    """
+    perform a multilevel V-cycle: coarsen the circuit by heavy-edge matching,
+    partition the coarsest level with kl or genetic, then project the
+    partition back level by level and refine it with KL passes
+    :param initial: the algorithm partitioning the coarsest level
+    :param coarsest: stop coarsening once a level has at most this many cells
+    :param passes: the maximum number of KL passes at each level
+    :param match_net_limit: nets with more pins are ignored by the matching
+    :param lookahead: bound the refinement passes, see lookahead_moves;
+                      0 for full passes
+    :param large_net: nets with more pins are left out of the gains of the
+                      initial partition and the refinement, 0 to keep every net
+    :param rng: random stream of the matching, the initial partition and
+                the refinement tie-breaks
+    :return: data container holding the partition of the original circuit
+    """
+    observer = observer or Observer()
+
+    levels: List[Hypergraph] = [circuit.hypergraph]
+    clusters: List[np.ndarray] = []
+    while levels[-1].get_cells_size() > coarsest:
+        fine = levels[-1]
+        cluster, coarse = coarsen(fine, coarsest, match_net_limit, rng)
+        # stop when the matching no longer shrinks the hypergraph enough
+        if coarse.get_cells_size() > 0.9 * fine.get_cells_size():
+            break
+        levels.append(coarse)
+        clusters.append(cluster)
+        logging.info(
+            "level {}: {} cells, {} nets".format(
+                len(levels) - 1, coarse.get_cells_size(), coarse.get_nets_size()
+            )
+        )
+
+    # partition the coarsest level, observed when it is the original circuit
+    data = INITIAL_PARTITIONERS[initial](
+        Circuit(levels[-1]),
+        observer if not clusters else None,
+        large_net=large_net,
+        rng=rng,
+    )
+    block_ids = np.asarray(data.get_node_block_ids(), dtype=np.int32)
+
+    # project back and refine, only the original circuit is observed
+    for level in range(len(clusters) - 1, -1, -1):
+        block_ids = block_ids[clusters[level]]
+        data = refine(
+            levels[level],
+            block_ids,
+            observer if level == 0 else None,
+            passes,
+            lookahead_moves(levels[level].get_cells_size(), lookahead),
+            large_net,
+            rng,
+        )
+        block_ids = np.asarray(data.get_node_block_ids(), dtype=np.int32)
+
+    return data
+
+
+def coarsen(hypergraph: Hypergraph, coarsest, match_net_limit, rng=random):
+    """
+    match every cell with its unmatched neighbour of heaviest connection,
+    rated sum(1 / (|net| - 1)) over the shared nets, under a cluster weight cap
+    :return: the cluster id of every cell, and the contracted hypergraph
+    """
+    net_ptr, net_pins, cell_ptr, cell_nets = hypergraph.as_lists()
+    weights = hypergraph.cell_weights.tolist()
+    n = hypergraph.get_cells_size()
+    # keep clusters light enough for the coarsest level to be balanced
+    max_weight = max(2, int(1.5 * sum(weights) / coarsest))
+
+    cluster = [-1] * n
+    clusters_size = 0
+    order = rng.sample(range(n), n)
+    for u in order:
+        if cluster[u] != -1:
+            continue
+
+        rating = {}
+        for net in cell_nets[cell_ptr[u] : cell_ptr[u + 1]]:
+            size = net_ptr[net + 1] - net_ptr[net]
+            if size < 2 or size > match_net_limit:
+                continue
+            score = 1 / (size - 1)
+            for v in net_pins[net_ptr[net] : net_ptr[net + 1]]:
+                if (
+                    v != u
+                    and cluster[v] == -1
+                    and weights[u] + weights[v] <= max_weight
+                ):
+                    rating[v] = rating.get(v, 0) + score
+
+        cluster[u] = clusters_size
+        if rating:
+            cluster[max(rating, key=rating.get)] = clusters_size
+        clusters_size += 1
+
+    cluster = np.asarray(cluster, dtype=np.int32)
+    return cluster, contract(hypergraph, cluster, clusters_size)
+
+
+def contract(hypergraph: Hypergraph, cluster: np.ndarray, clusters_size) -> Hypergraph:
+    """
+    merge the cells of every cluster; duplicate pins are removed and nets
+    left with a single pin are dropped, as they can never be cut, so the
+    cutsize of a projected partition is the same on both levels
+    :return: the contracted hypergraph
+    """
+    pins = cluster[hypergraph.net_pins]
+    nets = hypergraph.pin_nets()
+
+    # sort the pins by net then cluster, and drop the duplicates
+    order = np.lexsort((pins, nets))
+    pins, nets = pins[order], nets[order]
+    keep = np.ones(len(pins), dtype=bool)
+    keep[1:] = (pins[1:] != pins[:-1]) | (nets[1:] != nets[:-1])
+    pins, nets = pins[keep], nets[keep]
+
+    sizes = np.bincount(nets, minlength=hypergraph.get_nets_size())
+    kept_nets = sizes >= 2
+    pins = pins[kept_nets[nets]]
+    net_ptr = np.zeros(np.count_nonzero(kept_nets) + 1, dtype=np.int32)
+    np.cumsum(sizes[kept_nets], out=net_ptr[1:])
+
+    weights = np.bincount(
+        cluster, weights=hypergraph.cell_weights, minlength=clusters_size
+    )
+    return Hypergraph(clusters_size, net_ptr, pins, weights)
+
+
+def refine(
+    hypergraph: Hypergraph,
+    block_ids,
+    observer: Observer = None,
+    passes=6,
+    lookahead=0,
+    large_net=0,
+    rng=random,
+) -> Data:
+    """
+    rebalance a projected partition, then improve it with KL passes
+    :param lookahead: see kl_inner_loop
+    :param large_net: see init_partition
+    :param rng: see kl_inner_loop
+    :return: data container holding the refined partition
+    """
+    data = init_partition(hypergraph, block_ids.tolist(), large_net)
+    rebalance(hypergraph, data)
+    if observer is not None:
+        observer.on_pass(data)
+    return kl_outer_loop(
+        hypergraph, data, observer, passes, lookahead=lookahead, rng=rng
+    )
+
+
+def rebalance(hypergraph: Hypergraph, data: Data):
+    """
+    move the max gain nodes out of the heavier block, until the block
+    weights differ by at most the heaviest cell
+    """
+    _, _, cell_ptr, cell_nets = hypergraph.as_lists()
+    max_weight = int(hypergraph.cell_weights.max())
+
+    moved = False
+    while True:
+        weights = data.get_block_weight(0), data.get_block_weight(1)
+        heavier = 0 if weights[0] > weights[1] else 1
+        if weights[heavier] - weights[1 - heavier] <= max_weight:
+            break
+        if not data.block_has_unlocked_nodes(heavier):
+            break
+        cid = data.pop_block_max_gain(heavier)
+        nets = cell_nets[cell_ptr[cid] : cell_ptr[cid + 1]]
+        move_node_another_block(hypergraph, cid, nets, data)
+        moved = True
+
+    if moved:
+        # the rebalanced partition becomes the starting point of the next pass
+        data.store_best_cut()
+        kl_inner_stop(hypergraph, data)
+        data.prev_mincut = data.mincut
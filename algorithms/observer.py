@@ -0,0 +1,24 @@
+class Observer:
+    """
+    base class for anything following the progress of a partitioning run.
+    the algorithms own the control flow and only notify the observer; every
+    hook is a no-op, so a run behaves the same with or without one.
+    """
+
+    # set to True to be notified after every single move of a KL pass
+    watch_moves = False
+
+    def on_move(self, data):
+        """
+        called after a node is moved, only if watch_moves is set
+        """
+
+    def on_pass(self, data):
+        """
+        called at the end of a KL pass, once the best cut has been restored
+        """
+
+    def on_generation(self, population):
+        """
+        called at the end of a genetic generation with the population
+        """
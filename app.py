@@ -1,21 +1,33 @@
 import logging
+import random
 import tkinter.font as tk_font
 from math import sqrt, ceil
 from tkinter import ALL, Canvas, StringVar, Tk, E, N, S, W, filedialog, DISABLED, NORMAL
 from tkinter.ttk import Button, Frame, Label
 
-from algorithms.genetic import genetic
-from algorithms.kl import kl
 from model.circuit import Circuit
-from util.colors import locked_color
+from util.colors import heat_color, locked_color
 from util.logging import init_logging
+from worker import Worker
+
+# the canvas is redrawn at most this many times per second, however often
+# the algorithm reports progress; the run itself is never throttled
+MAX_FPS = 30
+# circuits with more cells are drawn as a heatmap of bins, not cell by cell
+DETAIL_LIMIT = 500
+# the max number of bins along each side of a block's heatmap
+HEATMAP_BINS = 16
 
 
 class App:
     def __init__(self, args=None) -> None:
         init_logging(args.verbose)
 
-        self.quick = args.quick
+        # in quick mode the canvas is only refreshed at the end of each pass
+        self.watch_moves = not args.quick
+        # a single stream for the session, every partitioning draws from it
+        self.rng = random.Random(args.seed)
+        self.__worker = None
         self.circuit = Circuit()
         self.root = Tk()
         self.__init_gui()
@@ -47,13 +59,44 @@ class App:
 
     def __partitioning(self, algorithm):
         """
-        called when "partition" is pressed, execture the branch and bound partitioning
+        called when "partition" is pressed, start the selected partitioning
+        in a worker thread; the app polls the snapshots of its progress
         """
-        if algorithm == "kl":
-            kl(self.circuit, self)
-        else:
-            genetic(self.circuit, self)
         self.update_partition_button(False)
+        self.__worker = Worker(
+            self.circuit, algorithm, self.rng, self.watch_moves, MAX_FPS
+        )
+        self.__worker.start()
+        self.__poll()
+
+    def __cancel(self):
+        """
+        called when "cancel" is pressed, stop the running partitioning
+        """
+        self.__worker.cancel()
+        self.root.nametowidget("btm.cancel")["state"] = DISABLED
+
+    def __poll(self):
+        """
+        render the latest snapshot of the worker, merging the cells changed
+        in the skipped ones, until the worker is done
+        """
+        done = not self.__worker.is_alive()
+        snapshot, cids = None, set()
+        while not self.__worker.snapshots.empty():
+            snapshot = self.__worker.snapshots.get()
+            if snapshot.cids is None or cids is None:
+                cids = None
+            else:
+                cids.update(snapshot.cids)
+
+        if snapshot is not None:
+            self.update_canvas(snapshot, cids)
+        if done:
+            self.__worker = None
+            self.update_partition_button(True)
+        else:
+            self.root.after(1000 // MAX_FPS, self.__poll)
 
     def __init_gui(self):
         """
@@ -102,6 +145,12 @@ class App:
         genetic_button.grid(column=2, row=0, padx=5, pady=5)
         genetic_button["state"] = DISABLED
 
+        cancel_button = Button(
+            btm_frame, text="Cancel", command=self.__cancel, name="cancel"
+        )
+        cancel_button.grid(column=3, row=0, padx=5, pady=5)
+        cancel_button["state"] = DISABLED
+
         # set up the info frame
         info_frame = Frame(self.root, name="info")
         info_frame.grid(column=2, row=0, rowspan=2, sticky=E + W)
@@ -123,9 +172,15 @@ class App:
         canvas.delete(ALL)
 
         self.node_pad = 5
+        # large circuits are aggregated, too many items would slow Tk down
+        self.__heatmap = self.circuit.get_cells_size() > DETAIL_LIMIT
+        self.__init_slots((self.circuit.get_cells_size() // 2) + 2)
 
-        max_cells_per_block = (self.circuit.get_cells_size() // 2) + 2
-
+    def __init_slots(self, max_cells_per_block):
+        """
+        size the grid of each block for max_cells_per_block cells, and free
+        every slot; no cell is rendered in a slot afterwards
+        """
         self.rows = ceil(sqrt(max_cells_per_block))
         self.cols = ceil(max_cells_per_block / self.rows)
 
@@ -138,50 +193,183 @@ class App:
 
         self.cw = 2 * ((self.cols + 1) * self.size + (self.cols - 1) * self.node_pad)
         self.ch = (self.rows + 1) * self.size + (self.rows - 1) * self.node_pad
-        canvas.config(width=self.cw, height=self.ch)
+        self.root.nametowidget("top.canvas").config(width=self.cw, height=self.ch)
+
+        # the rendered state of every cell, diffed against the partition to
+        # only redraw what changed; a cell keeps its slot until it moves
+        n = self.circuit.get_cells_size()
+        self.__block_ids = [-1] * n
+        self.__locked = [False] * n
+        self.__slots = [-1] * n
+        # free slots of each block, the lowest is taken first
+        slots = self.rows * self.cols
+        self.__free_slots = [list(range(slots - 1, -1, -1)) for _ in range(2)]
+
+        if self.__heatmap:
+            self.__init_heatmap(self.root.nametowidget("top.canvas"))
+
+    def __init_heatmap(self, canvas):
+        """
+        draw the bins of the heatmap of each block, every bin covering a
+        rectangle of slots, and the bundle standing for the cut nets
+        """
+        canvas.delete("heatmap")
+        self.bin_rows = ceil(self.rows / HEATMAP_BINS)  # slot rows per bin
+        self.bin_cols = ceil(self.cols / HEATMAP_BINS)  # slot cols per bin
+        rows = ceil(self.rows / self.bin_rows)
+        cols = ceil(self.cols / self.bin_cols)
+        step = self.size + self.node_pad
+
+        self.__bin_ids = []
+        for block_id in range(2):
+            for col in range(cols):
+                for row in range(rows):
+                    x1 = self.size // 2 + block_id * (self.cw // 2)
+                    x1 += col * self.bin_cols * step
+                    y1 = self.size // 2 + row * self.bin_rows * step
+                    x2 = x1 + self.bin_cols * step - self.node_pad
+                    y2 = y1 + self.bin_rows * step - self.node_pad
+                    self.__bin_ids.append(
+                        canvas.create_rectangle(
+                            x1, y1, x2, y2, fill="", outline="", tags="heatmap"
+                        )
+                    )
+        # the number of cells, and of locked cells, in every bin
+        self.__bin_cells = [0] * len(self.__bin_ids)
+        self.__bin_locked = [0] * len(self.__bin_ids)
+        self.__dirty_bins = set()
+
+        y = self.ch // 2
+        self.__bundle_id = canvas.create_line(
+            self.cw // 4, y, 3 * self.cw // 4, y, fill="black", tags="heatmap"
+        )
 
-    def update_canvas(self, data):
+    def update_canvas(self, data, cids=None):
         """
         update the canvas and update statistics being displayed.
+        :param cids: the cells that may have changed, every cell by default;
+                     only those cells and their nets are redrawn
         """
         canvas = self.root.nametowidget("top.canvas")
 
-        self.__update_cells(canvas, data)
-        self.__update_nets(canvas)
+        if cids is None:
+            cids = range(self.circuit.get_cells_size())
+        moved = self.__update_cells(canvas, data, cids)
+        if self.__heatmap:
+            self.__update_heatmap(canvas, data)
+        else:
+            self.__update_nets(canvas, moved)
         self.__update_info("info.cutsize", data.cutsize)
         self.__update_info("info.iteration", data.iteration)
 
-    def __update_cells(self, canvas, data):
+    def __update_cells(self, canvas, data, cids):
+        """
+        recolor the given cells whose lock changed, and move those whose
+        block changed to a free slot of their new block
+        :return: the cells moved
         """
-        update cells in canvas.
+        cells = self.circuit.cells
+        moved = []
+        for cid in cids:
+            block_id = data.get_node_block_id(cid)
+            locked = data.is_node_locked(cid)
+            if block_id != self.__block_ids[cid]:
+                moved.append(cid)
+                # free the slot now, so cells swapping blocks can take it
+                if self.__block_ids[cid] != -1:
+                    self.__count_in_bin(cid, -1)
+                    self.__free_slots[self.__block_ids[cid]].append(self.__slots[cid])
+                    self.__block_ids[cid] = -1
+            elif locked != self.__locked[cid]:
+                self.__count_in_bin(cid, -1)
+                self.__locked[cid] = locked
+                self.__count_in_bin(cid, 1)
+                if not self.__heatmap:
+                    cells[cid].set_color(canvas, self.__cell_color(block_id, locked))
+            self.__locked[cid] = locked
+
+        for cid in moved:
+            block_id = data.get_node_block_id(cid)
+            if not self.__free_slots[block_id]:
+                return self.__relayout(canvas, data)
+            self.__block_ids[cid] = block_id
+            self.__slots[cid] = self.__free_slots[block_id].pop()
+            self.__count_in_bin(cid, 1)
+            if not self.__heatmap:
+                self.__place_cell(canvas, cells[cid], block_id, self.__slots[cid])
+        return moved
+
+    def __count_in_bin(self, cid, count):
         """
-        x = [self.size // 2, self.cw // 2 + self.size // 2]
-        y = [self.size // 2, self.size // 2]
-        node_count = [0, 0]
-        for cell in self.circuit.cells:
-            block_id = data.get_node_block_id(cell)
-            x1, y1 = x[block_id], y[block_id]
-            x2, y2 = x1 + self.size, y1 + self.size
-            color = locked_color[block_id] if data.is_node_locked(cell) else "white"
-            cell.update(canvas, x1, y1, x2, y2, color)
-            node_count[block_id] += 1
-            next_col = (node_count[block_id] % self.rows) == 0
+        add the rendered cell to the counts of its heatmap bin, or remove it
+        with a negative count; cells without a slot are not counted
+        """
+        if not self.__heatmap or self.__block_ids[cid] == -1:
+            return
+        slot = self.__slots[cid]
+        rows = ceil(self.rows / self.bin_rows)
+        cols = ceil(self.cols / self.bin_cols)
+        index = self.__block_ids[cid] * rows * cols
+        index += (slot // self.rows) // self.bin_cols * rows
+        index += (slot % self.rows) // self.bin_rows
+        self.__bin_cells[index] += count
+        self.__bin_locked[index] += count if self.__locked[cid] else 0
+        self.__dirty_bins.add(index)
+
+    def __update_heatmap(self, canvas, data):
+        """
+        recolor the bins whose counts changed by the share of locked cells,
+        and set the width of the cut bundle by the share of cut nets
+        """
+        half = len(self.__bin_ids) // 2
+        for index in self.__dirty_bins:
+            cells = self.__bin_cells[index]
+            color = (
+                heat_color(int(index >= half), self.__bin_locked[index] / cells)
+                if cells
+                else ""
+            )
+            canvas.itemconfigure(self.__bin_ids[index], fill=color)
+        self.__dirty_bins.clear()
 
-            x[block_id] = x2 + self.node_pad if next_col else x1
-            y[block_id] = self.size // 2 if next_col else y2 + self.node_pad
+        cut = data.cutsize / max(1, self.circuit.get_nets_size())
+        canvas.itemconfigure(self.__bundle_id, width=1 + int(20 * cut))
 
-    def __update_nets(self, canvas):
+    def __relayout(self, canvas, data):
         """
-        update nets in canvas.
+        a block outgrew its grid: size the grids for the current blocks and
+        place every cell again
+        :return: every cell
         """
-        canvas.delete("netlist")
+        n = self.circuit.get_cells_size()
+        block1 = sum(data.get_node_block_ids())
+        self.__init_slots(max(n - block1, block1, n // 2 + 2))
+        return self.__update_cells(canvas, data, range(n))
 
-        for net in self.circuit.nets:
-            source = net.get_source()
-            x1, y1 = source.center_coords(canvas)
-            for sink in net.get_sinks():
-                x2, y2 = sink.center_coords(canvas)
-                canvas.create_line(x1, y1, x2, y2, tags="netlist", fill=net.color)
+    def __place_cell(self, canvas, cell, block_id, slot):
+        """
+        draw the cell in the given slot of its block
+        """
+        x1 = self.size // 2 + block_id * (self.cw // 2)
+        x1 += (slot // self.rows) * (self.size + self.node_pad)
+        y1 = self.size // 2 + (slot % self.rows) * (self.size + self.node_pad)
+        color = self.__cell_color(block_id, self.__locked[cell.cell_id])
+        cell.update(canvas, x1, y1, x1 + self.size, y1 + self.size, color)
+
+    @staticmethod
+    def __cell_color(block_id, locked):
+        """
+        :return: the color of a cell of the given block and lock state
+        """
+        return locked_color[block_id] if locked else "white"
+
+    def __update_nets(self, canvas, cids):
+        """
+        update the nets of the given cells in canvas.
+        """
+        cells = self.circuit.cells
+        for net in {net for cid in cids for net in cells[cid].nets}:
+            net.update(canvas)
 
     def __update_info(self, name: str, val):
         info = self.root.nametowidget(name)
@@ -189,5 +377,10 @@ class App:
         info.setvar(varname, val)
 
     def update_partition_button(self, enable):
-        self.root.nametowidget("btm.kl")["state"] = NORMAL if enable else DISABLED
-        self.root.nametowidget("btm.genetic")["state"] = NORMAL if enable else DISABLED
+        """
+        enable the buttons starting a run, or disable them and enable the
+        cancel button while a run is going on
+        """
+        for name in ["btm.open", "btm.kl", "btm.genetic"]:
+            self.root.nametowidget(name)["state"] = NORMAL if enable else DISABLED
+        self.root.nametowidget("btm.cancel")["state"] = DISABLED if enable else NORMAL
@@ -0,0 +1,219 @@
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import time
+from glob import glob
+
+from algorithms.fm import fm
+from algorithms.genetic import genetic
+from algorithms.island import island_genetic
+from algorithms.kl import kl
+from algorithms.kway import kway
+from algorithms.multilevel import multilevel
+from algorithms.observer import Observer
+from model.circuit import Circuit
+from util.logging import init_logging
+from util.metrics import metrics, profile
+from util.trace import trace
+
+ALGORITHMS = {
+    "kl": kl,
+    "fm": fm,
+    "genetic": genetic,
+    "island": island_genetic,
+    "multilevel": multilevel,
+    "kway": kway,
+}
+
+FIELDS = ["benchmark", "algorithm", "cells", "nets", "cutsize", "iterations", "seconds"]
+
+
+class IterationCounter(Observer):
+    """
+    count the KL passes or genetic generations of a run
+    """
+
+    def __init__(self):
+        self.iterations = 0
+
+    def on_pass(self, data):
+        self.iterations = data.iteration
+
+    def on_generation(self, population):
+        self.iterations += 1
+
+
+def run_batch(args):
+    """
+    partition every given netlist without a display, then write the results;
+    a failed run is logged and recorded in the results, the batch goes on
+    :return: the exit status, 1 if a run failed
+    """
+    init_logging(args.verbose)
+
+    if args.trace:
+        trace.open(args.trace)
+    results = []
+    failed = False
+    try:
+        for file in collect_netlists(args.netlists):
+            for algorithm in args.algorithm:
+                # every run gets a fresh stream, so with a seed each run of the
+                # batch is reproducible on its own
+                rng = random.Random(args.seed)
+                try:
+                    results.append(run_one(file, algorithm, args, rng))
+                except Exception as e:
+                    logging.exception("{} ({}) failed".format(file, algorithm))
+                    results.append(failed_row(file, algorithm, e))
+                    failed = True
+    finally:
+        trace.close()
+
+    write_results(results, args.output)
+    return 1 if failed else 0
+
+
+def collect_netlists(paths):
+    """
+    :return: the netlist files named by paths, directories are expanded to
+             the *.txt files they contain
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob(os.path.join(path, "*.txt"))))
+        else:
+            files.append(path)
+    return files
+
+
+def run_one(file, algorithm, args, rng=random) -> dict:
+    """
+    partition a single netlist with the given algorithm
+    :param rng: random stream of the run
+    :return: a row of the results table
+    """
+    circuit = Circuit()
+    circuit.parse_file(file, cache=not args.no_cache)
+
+    options = {}
+    if algorithm == "kl":
+        options = {"lookahead": args.lookahead, "large_net": args.large_net}
+    elif algorithm == "fm":
+        options = {
+            "tolerance": args.tolerance,
+            "lookahead": args.lookahead,
+            "large_net": args.large_net,
+        }
+    elif algorithm == "genetic":
+        options = {
+            "offspring": args.offspring,
+            "workers": args.workers,
+            "lookahead": args.lookahead,
+            "large_net": args.large_net,
+        }
+    elif algorithm == "island":
+        options = {
+            "islands": args.islands,
+            "interval": args.migration_interval,
+            "topology": args.topology,
+        }
+    elif algorithm == "multilevel":
+        options = {
+            "initial": args.initial,
+            "coarsest": args.coarsest,
+            "lookahead": args.lookahead,
+            "large_net": args.large_net,
+        }
+    elif algorithm == "kway":
+        options = {
+            "k": args.blocks,
+            "objective": args.objective,
+            "bisection": args.bisection,
+            "workers": args.workers,
+            "imbalance": args.imbalance,
+        }
+
+    trace.begin(
+        benchmark=circuit.benchmark,
+        algorithm=algorithm,
+        seed=args.seed,
+        cells=circuit.get_cells_size(),
+        nets=circuit.get_nets_size(),
+        options=options,
+    )
+    counter = IterationCounter()
+    metrics.reset()
+    metrics.enable(args.metrics)
+    try:
+        with profile(args.profile):
+            start = time.perf_counter()
+            best = ALGORITHMS[algorithm](circuit, counter, rng=rng, **options)
+            seconds = time.perf_counter() - start
+    finally:
+        metrics.enable(False)
+
+    logging.info(
+        "{} ({}): cutsize = {} in {:.3f}s".format(
+            circuit.benchmark, algorithm, best.mincut, seconds
+        )
+    )
+
+    row = {
+        "benchmark": circuit.benchmark,
+        "algorithm": algorithm,
+        "cells": circuit.get_cells_size(),
+        "nets": circuit.get_nets_size(),
+        "cutsize": best.mincut,
+        "iterations": counter.iterations,
+        "seconds": round(seconds, 6),
+    }
+    row.update(metrics.report())
+    trace.event("end", cutsize=best.mincut, seconds=round(seconds, 6))
+    return row
+
+
+def failed_row(file, algorithm, error) -> dict:
+    """
+    :return: the row of a run that raised the given error
+    """
+    return {
+        "benchmark": os.path.basename(file),
+        "algorithm": algorithm,
+        "error": describe(error),
+    }
+
+
+def describe(error) -> str:
+    """
+    :return: the type and message of the given error
+    """
+    return "{}: {}".format(type(error).__name__, error)
+
+
+def write_results(results, output=None):
+    """
+    write the results table as JSON if output ends with .json, otherwise as
+    CSV; the table goes to stdout when no output is given
+    """
+    f = open(output, "w", newline="") if output else sys.stdout
+    try:
+        if output and output.endswith(".json"):
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        else:
+            # the metrics differ between the algorithms, a run lacking one
+            # leaves its cell empty
+            fields = list(FIELDS)
+            for row in results:
+                fields.extend(key for key in row if key not in fields)
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(results)
+    finally:
+        if output:
+            f.close()
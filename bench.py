@@ -0,0 +1,270 @@
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from algorithms.fm import fm
+from algorithms.genetic import genetic
+from algorithms.kl import kl
+from batch import IterationCounter, collect_netlists, describe
+from model.circuit import Circuit
+from util.logging import init_logging
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is not recorded
+    resource = None
+
+ALGORITHMS = {"kl": kl, "fm": fm, "genetic": genetic}
+
+
+class MoveCounter(IterationCounter):
+    """
+    count the passes or generations of a run, and the moves they made
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.moves = 0
+
+    def on_pass(self, data):
+        super().on_pass(data)
+        self.moves = data.moves
+
+    def on_generation(self, population):
+        super().on_generation(population)
+        self.moves = population.moves
+
+
+def run_bench(args):
+    """
+    run every algorithm on every netlist with args.runs seeds, write the
+    results as JSON and compare them with a baseline
+    :return: the exit status, 1 if a regression is found
+    """
+    init_logging(args.verbose)
+
+    first = 0 if args.seed is None else args.seed
+    seeds = [first + i for i in range(args.runs)]
+    results = []
+    failed = False
+    for file in collect_netlists(args.netlists):
+        for algorithm in args.algorithm:
+            runs = []
+            failures = []
+            for seed in seeds:
+                try:
+                    runs.append(run_isolated(file, algorithm, seed, not args.no_cache))
+                except Exception as e:
+                    logging.exception(
+                        "{} ({}, seed {}) failed".format(file, algorithm, seed)
+                    )
+                    failures.append({"seed": seed, "error": describe(e)})
+            failed = failed or bool(failures)
+            if not runs:
+                results.append(
+                    {
+                        "benchmark": os.path.basename(file),
+                        "algorithm": algorithm,
+                        "failures": failures,
+                    }
+                )
+                continue
+
+            results.append(summarize(runs))
+            results[-1]["failures"] = failures
+            logging.info(
+                "{} ({}): mean cutsize = {:.1f}, median time = {:.3f}s".format(
+                    results[-1]["benchmark"],
+                    algorithm,
+                    results[-1]["cutsize"]["mean"],
+                    results[-1]["seconds"],
+                )
+            )
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seeds": seeds,
+        "results": results,
+    }
+    f = open(args.output, "w") if args.output else sys.stdout
+    try:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    finally:
+        if args.output:
+            f.close()
+
+    if args.baseline is None:
+        return 1 if failed else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, report, args.time_threshold, args.cut_threshold)
+    return 1 if failed or regressions else 0
+
+
+def run_isolated(file, algorithm, seed, cache=True) -> dict:
+    """
+    run the algorithm in a fresh process, so that the peak RSS belongs to
+    this run alone; the process is forked from a small fork server, as a
+    process forked or even spawned from this one starts from the peak RSS
+    of this process
+    """
+    with ProcessPoolExecutor(1, mp_context=fresh_context()) as executor:
+        return executor.submit(run_one, file, algorithm, seed, cache).result()
+
+
+def fresh_context():
+    """
+    :return: the forkserver multiprocessing context, or the default one
+             where it is not available
+    """
+    try:
+        return multiprocessing.get_context("forkserver")
+    except ValueError:
+        return None
+
+
+def run_one(file, algorithm, seed, cache=True) -> dict:
+    """
+    partition a single netlist with the given algorithm and seed
+    :return: the measures of the run
+    """
+    circuit = Circuit()
+    circuit.parse_file(file, cache=cache)
+
+    counter = MoveCounter()
+    start = time.perf_counter()
+    best = ALGORITHMS[algorithm](circuit, counter, rng=random.Random(seed))
+    seconds = time.perf_counter() - start
+
+    return {
+        "benchmark": circuit.benchmark,
+        "algorithm": algorithm,
+        "cells": circuit.get_cells_size(),
+        "nets": circuit.get_nets_size(),
+        "seed": seed,
+        "cutsize": best.mincut,
+        "iterations": counter.iterations,
+        "moves": counter.moves,
+        "seconds": seconds,
+        "peak_rss_kb": peak_rss(),
+    }
+
+
+def peak_rss():
+    """
+    :return: the peak resident set size of this process in KiB, or None
+             where it cannot be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def summarize(runs) -> dict:
+    """
+    :return: the measures of a netlist and algorithm over all the seeds; the
+             times are medians, robust to a slow outlier run
+    """
+    cutsizes = [run["cutsize"] for run in runs]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    iterations = sum(run["iterations"] for run in runs)
+    moves = sum(run["moves"] for run in runs)
+    total = sum(run["seconds"] for run in runs)
+    rss = [run["peak_rss_kb"] for run in runs if run["peak_rss_kb"] is not None]
+
+    return {
+        "benchmark": runs[0]["benchmark"],
+        "algorithm": runs[0]["algorithm"],
+        "cells": runs[0]["cells"],
+        "nets": runs[0]["nets"],
+        "cutsize": {
+            "min": min(cutsizes),
+            "mean": statistics.mean(cutsizes),
+            "max": max(cutsizes),
+            "stdev": statistics.pstdev(cutsizes),
+        },
+        "seconds": round(seconds, 6),
+        "seconds_per_iteration": round(total / iterations, 6) if iterations else None,
+        "moves_per_second": round(moves / total) if total else None,
+        "peak_rss_kb": max(rss) if rss else None,
+        "runs": [
+            {
+                "seed": run["seed"],
+                "cutsize": run["cutsize"],
+                "iterations": run["iterations"],
+                "moves": run["moves"],
+                "seconds": round(run["seconds"], 6),
+            }
+            for run in runs
+        ],
+    }
+
+
+def compare(baseline, report, time_threshold=0.1, cut_threshold=0.05) -> list:
+    """
+    log the change of every result against the baseline; a result is a
+    speed regression if its median time grew by more than time_threshold,
+    and a quality regression if its mean cutsize grew by more than
+    cut_threshold, both relative to the baseline
+    :return: the regressions, as (benchmark, algorithm, kind) tuples
+    """
+    previous = {(r["benchmark"], r["algorithm"]): r for r in baseline["results"]}
+    regressions = []
+
+    logging.info(
+        "{:<14} {:<9} {:>9} {:>9}  {}".format(
+            "benchmark", "algorithm", "time", "cutsize", "flags"
+        )
+    )
+    for result in report["results"]:
+        key = result["benchmark"], result["algorithm"]
+        if result.get("failures"):
+            regressions.append(key + ("FAILED",))
+            logging.info("{:<14} {:<9} {:>9} {:>9}  FAILED".format(*key, "", ""))
+            continue
+        if key not in previous or "cutsize" not in previous[key]:
+            logging.info("{:<14} {:<9} {:>9} {:>9}  new".format(*key, "", ""))
+            continue
+
+        time_change = relative(result["seconds"], previous[key]["seconds"])
+        cut_change = relative(
+            result["cutsize"]["mean"], previous[key]["cutsize"]["mean"]
+        )
+        flags = []
+        if time_change > time_threshold:
+            flags.append("SLOWER")
+        if cut_change > cut_threshold:
+            flags.append("WORSE CUT")
+        regressions.extend(key + (flag,) for flag in flags)
+
+        logging.info(
+            "{:<14} {:<9} {:>+9.1%} {:>+9.1%}  {}".format(
+                *key, time_change, cut_change, " ".join(flags)
+            )
+        )
+
+    if regressions:
+        logging.warning(
+            "{} regression(s) against the baseline".format(len(regressions))
+        )
+    return regressions
+
+
+def relative(value, reference) -> float:
+    """
+    :return: the change from reference to value, relative to reference
+    """
+    if reference == 0:
+        return 0.0 if value == 0 else float("inf")
+    return (value - reference) / reference
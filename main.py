@@ -1,7 +1,4 @@
 import argparse
-import sys
-
-from app import App
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -24,8 +21,258 @@ if __name__ == "__main__":
         action="store_true",
     )
 
+    parser.add_argument(
+        "-s",
+        "--seed",
+        help="seed of the random number generator, for reproducible runs",
+        type=int,
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="partition netlists headlessly and write a results table"
+    )
+
+    batch_parser.add_argument(
+        "netlists",
+        help="netlist files, or directories of *.txt netlists",
+        nargs="+",
+    )
+
+    batch_parser.add_argument(
+        "-a",
+        "--algorithm",
+        help="partitioning algorithm(s) to run",
+        choices=["kl", "fm", "genetic", "island", "multilevel", "kway"],
+        nargs="+",
+        default=["kl"],
+    )
+
+    batch_parser.add_argument(
+        "-o",
+        "--output",
+        help="results file, JSON if it ends with .json, otherwise CSV (default: stdout)",
+    )
+
+    batch_parser.add_argument(
+        "-s",
+        "--seed",
+        help="seed of the random number generator, for reproducible runs",
+        type=int,
+        # also accepted before the command, for the GUI
+        default=argparse.SUPPRESS,
+    )
+
+    batch_parser.add_argument(
+        "--lookahead",
+        help="end a pass after this fraction of the cells moves without a better cut (0: full passes)",
+        type=float,
+        default=0.0,
+    )
+
+    batch_parser.add_argument(
+        "--large-net",
+        help="nets with more pins are left out of the gain updates (0: none)",
+        type=int,
+        default=0,
+    )
+
+    batch_parser.add_argument(
+        "--tolerance",
+        help="fm balance tolerance, a block may weigh up to 0.5 + tolerance of the total",
+        type=float,
+        default=0.05,
+    )
+
+    batch_parser.add_argument(
+        "--offspring",
+        help="number of offspring produced per genetic generation",
+        type=int,
+        default=1,
+    )
+
+    batch_parser.add_argument(
+        "-j",
+        "--workers",
+        help="number of processes for the genetic local improvement (0: in process)",
+        type=int,
+        default=0,
+    )
+
+    batch_parser.add_argument(
+        "--islands",
+        help="number of island populations, each evolving in its own process",
+        type=int,
+        default=4,
+    )
+
+    batch_parser.add_argument(
+        "--migration-interval",
+        help="number of generations between two island migrations",
+        type=int,
+        default=10,
+    )
+
+    batch_parser.add_argument(
+        "--topology",
+        help="island migration topology",
+        choices=["ring", "random"],
+        default="ring",
+    )
+
+    batch_parser.add_argument(
+        "--initial",
+        help="algorithm partitioning the coarsest multilevel level",
+        choices=["kl", "genetic"],
+        default="kl",
+    )
+
+    batch_parser.add_argument(
+        "--coarsest",
+        help="number of cells below which multilevel stops coarsening",
+        type=int,
+        default=200,
+    )
+
+    batch_parser.add_argument(
+        "-k",
+        "--blocks",
+        help="number of kway blocks, a power of 2",
+        type=int,
+        default=4,
+    )
+
+    batch_parser.add_argument(
+        "--objective",
+        help="kway objective, cut nets or sum of (blocks spanned - 1)",
+        choices=["cut", "km1"],
+        default="cut",
+    )
+
+    batch_parser.add_argument(
+        "--bisection",
+        help="algorithm of the kway recursive bisection",
+        choices=["kl", "fm", "multilevel"],
+        default="kl",
+    )
+
+    batch_parser.add_argument(
+        "--imbalance",
+        help="kway balance, a block may weigh up to (1 + imbalance) / k of the total",
+        type=float,
+        default=0.1,
+    )
+
+    batch_parser.add_argument(
+        "--no-cache",
+        help="parse the netlists again, ignoring their binary cache",
+        action="store_true",
+    )
+
+    batch_parser.add_argument(
+        "--metrics",
+        help="add the counters and phase timers of every run to the results",
+        action="store_true",
+    )
+
+    batch_parser.add_argument(
+        "--trace",
+        help="write the convergence of every run, pass by pass and generation by generation, to this JSONL file",
+    )
+
+    batch_parser.add_argument(
+        "--profile",
+        help="log a profile of every run, of the time or of the memory",
+        choices=["cprofile", "tracemalloc"],
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench",
+        help="time the algorithms over the benchmarks, and compare with a baseline",
+    )
+
+    bench_parser.add_argument(
+        "netlists",
+        help="netlist files, or directories of *.txt netlists (default: benchmarks)",
+        nargs="*",
+        default=["benchmarks"],
+    )
+
+    bench_parser.add_argument(
+        "-a",
+        "--algorithm",
+        help="partitioning algorithm(s) to run",
+        choices=["kl", "fm", "genetic"],
+        nargs="+",
+        default=["kl", "genetic"],
+    )
+
+    bench_parser.add_argument(
+        "-n",
+        "--runs",
+        help="number of runs of every algorithm on every netlist, with seeds seed, seed + 1, ...",
+        type=int,
+        default=3,
+    )
+
+    bench_parser.add_argument(
+        "-s",
+        "--seed",
+        help="seed of the first run (default: 0)",
+        type=int,
+        # also accepted before the command, like the batch seed
+        default=argparse.SUPPRESS,
+    )
+
+    bench_parser.add_argument(
+        "-o",
+        "--output",
+        help="JSON results file",
+    )
+
+    bench_parser.add_argument(
+        "-b",
+        "--baseline",
+        help="JSON results file of a previous run to compare with",
+    )
+
+    bench_parser.add_argument(
+        "--time-threshold",
+        help="flag a median time grown by more than this fraction of the baseline",
+        type=float,
+        default=0.1,
+    )
+
+    bench_parser.add_argument(
+        "--cut-threshold",
+        help="flag a mean cutsize grown by more than this fraction of the baseline",
+        type=float,
+        default=0.05,
+    )
+
+    bench_parser.add_argument(
+        "--no-cache",
+        help="parse the netlists again, ignoring their binary cache",
+        action="store_true",
+    )
+
     args = parser.parse_args()
 
-    sys.setrecursionlimit(1500)
+    if args.command == "batch":
+        import sys
+
+        from batch import run_batch
+
+        sys.exit(run_batch(args))
+    elif args.command == "bench":
+        import sys
+
+        from bench import run_bench
+
+        sys.exit(run_bench(args))
+    else:
+        # tkinter is only imported when the GUI is requested
+        from app import App
 
-    App(args)
+        App(args)
@@ -1,50 +1,108 @@
 class Block:
-    def __init__(self, pmax):
-        self.__node_ids = set()
-        self.__buckets: dict = {i: dict() for i in range(-pmax, pmax + 1)}
+    """
+    gain buckets of a block, stored as doubly-linked lists in preallocated
+    arrays indexed by cell id, so that every bucket operation is a constant
+    number of array writes
+    """
+
+    def __init__(self, pmax, links, weights):
+        """
+        :param links: next / prev int arrays of the bucket lists, a node is
+                      in a single bucket at a time, so both blocks share them
+        :param weights: weight of each cell, shared with the data
+        """
+        self.__weights = weights
+        self.__heads = [-1] * (2 * pmax + 1)  # first node of each gain bucket
+        self.__next, self.__prev = links
         self.__max_gain = -pmax
         self.__pmax = pmax
-        self.__count = 0
+        self.__size = 0  # number of nodes, locked or not
+        self.__weight = 0  # total weight of the nodes, locked or not
+        self.__count = 0  # number of unlocked nodes
+        self.bucket_scans = 0  # empty buckets stepped over to find the max gain
 
     def reset(self):
         """
         reset the block
         """
-        self.__init__(self.__pmax)
+        self.__heads[:] = [-1] * len(self.__heads)
+        self.__max_gain = -self.__pmax
+        self.__size = 0
+        self.__weight = 0
+        self.__count = 0
 
     def size(self) -> int:
         """
         :return: the number of nodes in the block
         """
-        return len(self.__node_ids)
+        return self.__size
+
+    def weight(self) -> int:
+        """
+        :return: the total weight of the nodes in the block
+        """
+        return self.__weight
 
-    def add_unlocked_node(self, cell, data):
+    def add_unlocked_node(self, cid, gain):
         """
-        add specified unlocked node to the block
+        add specified unlocked node to the block, in the bucket of its gain
         """
-        if data.is_node_locked(cell):
-            raise ValueError
-        self.__node_ids.add(cell.cell_id)
-        gain = data.get_node_gain(cell)
-        self.__buckets[gain][cell.cell_id] = cell
+        self.__link(cid, gain)
+        self.__size += 1
+        self.__weight += self.__weights[cid]
         self.__count += 1
-        self.__max_gain = max(gain, self.__max_gain)  # update max gain pointer
 
-    def add_locked_node(self, cell, data):
+    def add_locked_node(self, cid):
         """
         add specified locked noode to the block
         """
-        if data.is_node_unlocked(cell):
-            raise ValueError
-        self.__node_ids.add(cell.cell_id)
+        self.__size += 1
+        self.__weight += self.__weights[cid]
+
+    def remove_locked_node(self, cid):
+        """
+        remove specified locked node from the block
+        """
+        self.__size -= 1
+        self.__weight -= self.__weights[cid]
+
+    def remove_node(self, cid, gain):
+        """
+        remove specified unlocked node from the block
+        """
+        self.__unlink(cid, gain)
+        self.__update_max_gain()
+        self.__size -= 1
+        self.__weight -= self.__weights[cid]
+        self.__count -= 1
 
-    def remove_node(self, cell, data):
+    def update_node_gain(self, cid, gain, new_gain):
         """
-        remove specified node from the block
+        move specified unlocked node from the bucket of gain to the bucket of new_gain
         """
-        gain = data.get_node_gain(cell)
-        del self.__buckets[gain][cell.cell_id]
-        self.__remove_node(cell)
+        # this is the hot path of a pass, so unlink / link are written inline
+        heads, nexts, prevs, pmax = self.__heads, self.__next, self.__prev, self.__pmax
+
+        prev, nxt = prevs[cid], nexts[cid]
+        if prev == -1:
+            heads[gain + pmax] = nxt
+        else:
+            nexts[prev] = nxt
+        if nxt != -1:
+            prevs[nxt] = prev
+
+        bucket = new_gain + pmax
+        head = heads[bucket]
+        nexts[cid] = head
+        prevs[cid] = -1
+        if head != -1:
+            prevs[head] = cid
+        heads[bucket] = cid
+
+        if new_gain > self.__max_gain:
+            self.__max_gain = new_gain
+        elif heads[self.__max_gain + pmax] == -1:
+            self.__update_max_gain()
 
     def has_unlocked_nodes(self) -> bool:
         """
@@ -52,36 +110,58 @@ class Block:
         """
         return self.__count != 0
 
-    def pop_max_gain_node(self):
+    def peek_max_gain_node(self) -> int:
+        """
+        :return: node with the max gain in the block, left in the block
+        """
+        return self.__heads[self.__max_gain + self.__pmax]
+
+    def pop_max_gain_node(self) -> int:
         """
         :return: node with the max gain in the block
         """
-        (_, node) = self.__buckets[self.__max_gain].popitem()
-        self.__remove_node(node)
-        return node
+        cid = self.__heads[self.__max_gain + self.__pmax]
+        self.remove_node(cid, self.__max_gain)
+        return cid
 
-    def __remove_node(self, cell):
-        self.__node_ids.remove(cell.cell_id)
-        self.__update_max_gain()
-        self.__count -= 1
+    def __link(self, cid, gain):
+        """
+        push the node at the front of the bucket of gain
+        """
+        bucket = gain + self.__pmax
+        head = self.__heads[bucket]
+        self.__next[cid] = head
+        self.__prev[cid] = -1
+        if head != -1:
+            self.__prev[head] = cid
+        self.__heads[bucket] = cid
+        if gain > self.__max_gain:  # update max gain pointer
+            self.__max_gain = gain
+
+    def __unlink(self, cid, gain):
+        """
+        take the node out of the bucket of gain
+        """
+        prev, nxt = self.__prev[cid], self.__next[cid]
+        if prev == -1:
+            self.__heads[gain + self.__pmax] = nxt
+        else:
+            self.__next[prev] = nxt
+        if nxt != -1:
+            self.__prev[nxt] = prev
 
     def __update_max_gain(self):
         """
         update max gain until finding not empty bucket
         """
-        while (self.__max_gain > -self.__pmax) and (
-                not self.__buckets[self.__max_gain]
-        ):
+        heads, pmax = self.__heads, self.__pmax
+        max_gain = self.__max_gain
+        while (self.__max_gain > -pmax) and heads[self.__max_gain + pmax] == -1:
             self.__max_gain -= 1
+        self.bucket_scans += max_gain - self.__max_gain
 
     def get_max_gain(self) -> int:
         """
         :return: the maximum gain in the block
         """
         return self.__max_gain
-
-    def copy_set(self):
-        """
-        :return: copy of node list in the block
-        """
-        return self.__node_ids.copy()
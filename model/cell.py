@@ -4,6 +4,8 @@ class Cell:
         self.nets = []
         self.__text_id = None
         self.__rect_id = None
+        self.__center = None
+        self.__color = None
 
     def get_nets_size(self) -> int:
         """
@@ -21,36 +23,46 @@ class Cell:
         """
         update location and color of the cell in the canvas
         """
+        self.__center = [(x1 + x2) // 2, (y1 + y2) // 2]
         if self.__rect_id is None:
             self.__rect_id = canvas.create_rectangle(x1, y1, x2, y2, fill=color)
+            self.__color = color
         else:
             canvas.coords(self.__rect_id, x1, y1, x2, y2)
+            self.set_color(canvas, color)
+        self.__set_text(canvas, x2 - x1)
+
+    def set_color(self, canvas, color):
+        """
+        update the color of the cell in the canvas, if it changed
+        """
+        if color != self.__color:
             canvas.itemconfigure(self.__rect_id, fill=color)
-        self.__set_text(canvas)
+            self.__color = color
 
-    def center_coords(self, canvas):
+    def center_coords(self):
         """
-        :return: center coords of the current cell in the canvas
+        :return: center coords of the current cell in the canvas, as last
+                 placed by update, without querying the canvas
         """
-        x1, y1, x2, y2 = canvas.coords(self.__rect_id)  # get rect coords
-        return [(x1 + x2) // 2, (y1 + y2) // 2]
+        return self.__center
 
-    def __set_text(self, canvas):
+    def __set_text(self, canvas, size):
         """
         set the text, and place at the center of the rectangle
         """
-        x, y = self.center_coords(canvas)
+        x, y = self.__center
         if self.__text_id is None:
             self.__text_id = canvas.create_text(
-                x, y, font=self.__get_font(canvas), text=str(self.cell_id)
+                x, y, font=self.__get_font(size), text=str(self.cell_id)
             )
         else:
             canvas.coords(self.__text_id, x, y)
-            canvas.itemconfigure(self.__text_id, text=str(self.cell_id))
+            canvas.itemconfigure(self.__text_id, font=self.__get_font(size))
 
-    def __get_font(self, canvas):
+    @staticmethod
+    def __get_font(size):
         """
-        :return: font with an appropriate size
+        :return: font with an appropriate size for a cell of the given width
         """
-        x1, _, x2, _ = canvas.coords(self.__rect_id)
-        return "Helvetica", int((x2 - x1) / 3)
+        return "Helvetica", int(size / 3)
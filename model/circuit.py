@@ -2,68 +2,69 @@ import os
 
 from model.cell import Cell
 from model.net import Net
-from util.colors import random_colors
+from model.netlist import load_netlist
 
 
 class Circuit:
-    def __init__(self):
-        self.cells = []
-        self.nets = []
+    def __init__(self, hypergraph=None):
+        self.hypergraph = hypergraph
         self.benchmark = None
+        self.__cells = None
+        self.__nets = None
 
-    def parse_file(self, file):
+    def parse_file(self, file, cache=True):
         """
         parse the input file
+        :param cache: False to ignore the binary cache of the netlist
         """
         self.benchmark = os.path.basename(file)
+        self.hypergraph = load_netlist(file, cache)
+        self.__cells = None
+        self.__nets = None
 
-        with open(file, "r") as f:
-            first = f.readline().strip().split()
-            self.__init_cells(int(first[0]))
-            self.__init_circuit(int(first[1]), f)
-
-    def __init_cells(self, cells) -> None:
+    @property
+    def cells(self):
         """
-        initialized the cell list
-        :param cells: the number of cells to be palaced
+        per-object cells, only built on demand for rendering
         """
-        self.cells = [Cell(i) for i in range(cells)]
+        if self.__cells is None:
+            self.__init_objects()
+        return self.__cells
 
-    def __init_circuit(self, connections, f) -> None:
+    @property
+    def nets(self):
         """
-        initialize the netslist
-        :param connections: the number of connections / nets
-        :param f: the input file
+        per-object nets, only built on demand for rendering
         """
-        self.nets = []
-        colors = random_colors(connections)
-
-        for i in range(connections):
-            self.__read_net(colors[i % len(colors)], f.readline())
+        if self.__nets is None:
+            self.__init_objects()
+        return self.__nets
 
-    def __read_net(self, color, s) -> None:
+    def __init_objects(self) -> None:
         """
-        create a net, based on the data, assign an unique color
-        then add to netlist
+        create a Cell / Net object for every node / net of the hypergraph
         """
-        data = s.strip().split()
+        hypergraph = self.hypergraph
+        connections = hypergraph.get_nets_size()
 
-        net = Net(len(self.nets), color)
-        for i in data[1:]:
-            cell = self.cells[int(i)]
-            cell.add_net(net)
-            net.add_cell(cell)
-
-        self.nets.append(net)
+        self.__cells = [Cell(i) for i in range(hypergraph.get_cells_size())]
+        self.__nets = []
+        for i in range(connections):
+            net = Net(i)
+            for cid in hypergraph.net_cells(i).tolist():
+                cell = self.__cells[cid]
+                cell.add_net(net)
+                net.add_cell(cell)
+            self.__nets.append(net)
 
     def get_nets_size(self) -> int:
         """
         :return: the number of nets in this circuit
         """
-        return len(self.nets)
+        return self.hypergraph.get_nets_size()
 
     def get_cells_size(self) -> int:
         """
         :return: the number of cells in this circuit
         """
-        return len(self.cells)
+        return self.hypergraph.get_cells_size()
@@ -1,57 +1,87 @@
 import logging
+from array import array
 from typing import List
 
 from model.block import Block
 
 
 class Data:
-    def __init__(self, pmax, nets_size, nodes_block_id):
+    def __init__(self, pmax, nets_size, nodes_block_id, nodes_weight=None):
         self.iteration = 1
+        self.moves = 0  # moves made by all the passes
 
-        self.__blocks = [Block(pmax), Block(pmax)]
-        self.__nets_distribution = [[0, 0]] * nets_size
-        self.__nodes_locked = [False] * len(nodes_block_id)
-        self.__nodes_gain = [0] * len(nodes_block_id)
+        cells_size = len(nodes_block_id)
+        if nodes_weight is None:
+            nodes_weight = [1] * cells_size
+        # typed arrays store the cell ids unboxed, unlike python lists
+        links = array("i", [-1]) * cells_size, array("i", [-1]) * cells_size
+        self.__blocks = [
+            Block(pmax, links, nodes_weight),
+            Block(pmax, links, nodes_weight),
+        ]
+        self.__nets_distribution = [[0] * nets_size, [0] * nets_size]
+        # nets left out of the gains, their cut is tracked on the cutsize only
+        self.__large_nets = bytearray(nets_size)
+        self.saved_pin_visits = 0
+        # work of the gain updates, counted per net rather than per cell
+        self.pin_visits = 0
+        self.gain_updates = 0
+        self.__nodes_locked = bytearray(cells_size)
+        self.__nodes_gain = [0] * cells_size
         self.__nodes_block_id = nodes_block_id
+        self.__nodes_weight = nodes_weight
 
-        self.__best_partition = None
+        # nodes moved in the current pass, in order; a node moves at most once
+        # per pass, so the log is allocated once and reused by every pass
+        self.__moves = array("i", [-1]) * cells_size
+        self.__moves_size = 0
+        self.__best_move = 0  # number of moves leading to the best cut
         self.cutsize = None
         self.prev_mincut = None
         self.mincut = None
 
     def restore_best_cut(self):
         """
-        restore the best cut in the current pass
+        restore the best cut in the current pass, once the moves after it
+        have been undone: every node is unlocked again with its current gain
         """
         # reset block data structure
         for block in self.__blocks:
             block.reset()
 
-        # restore block id for each node
-        for block, cids in enumerate(self.__best_partition):
-            for cid in cids:
-                self.__nodes_block_id[cid] = block
+        for cid, block_id in enumerate(self.__nodes_block_id):
+            self.unlock_node(cid, block_id)
+
+        # start a new move log
+        self.__moves_size = 0
+        self.__best_move = 0
 
         # restore cutsize
         self.cutsize = self.mincut
 
     def store_best_cut(self):
         """
-        store the best cut
+        store the best cut, as the number of moves leading to it
         """
-        # store block id for each node
-        block0 = list(self.__blocks[0].copy_set())
-        block1 = list(self.__blocks[1].copy_set())
-        self.__best_partition = [block0, block1]
+        self.__best_move = self.__moves_size
 
         # store the mincut
         self.mincut = self.cutsize
 
-    def update_cutsize_by_gain(self, cell):
+    def pop_moves_after_best_cut(self) -> array:
+        """
+        :return: the nodes moved after the best cut, latest first
+        """
+        moves = self.__moves[self.__best_move : self.__moves_size]
+        self.__moves_size = self.__best_move
+        moves.reverse()
+        return moves
+
+    def update_cutsize_by_gain(self, cid):
         """
         update the cutsize by the gain, after moving max gain node to another block
         """
-        self.cutsize -= self.__nodes_gain[cell.cell_id]
+        self.cutsize -= self.__nodes_gain[cid]
 
     def has_unlocked_nodes(self) -> bool:
         """
@@ -62,104 +92,120 @@ class Data:
             or self.__blocks[1].has_unlocked_nodes()
         )
 
-    def is_node_locked(self, cell) -> bool:
+    def block_has_unlocked_nodes(self, block_id) -> bool:
         """
-        :return: True if cell is locked
+        :return: True if there are unlocked nodes remains in the given block
         """
-        return self.__nodes_locked[cell.cell_id]
+        return self.__blocks[block_id].has_unlocked_nodes()
 
-    def is_node_unlocked(self, cell) -> bool:
+    def is_node_locked(self, cid) -> bool:
         """
-        :return: True if cell is unlocked
+        :return: True if cell is locked
         """
-        return not self.__nodes_locked[cell.cell_id]
+        return self.__nodes_locked[cid] == 1
 
-    def unlock_node(self, cell, block_id):
+    def unlock_node(self, cid, block_id):
         """
         unlock the cell
         """
-        self.__nodes_locked[cell.cell_id] = False
-        self.__blocks[block_id].add_unlocked_node(cell, self)
+        self.__nodes_locked[cid] = 0
+        self.__blocks[block_id].add_unlocked_node(cid, self.__nodes_gain[cid])
 
-    def lock_node(self, cell, block_id):
+    def lock_node(self, cid, block_id):
         """
-        lock the cell
+        lock the cell in the block it is moved to, and log the move
         """
-        self.__nodes_locked[cell.cell_id] = True
-        self.__nodes_block_id[cell.cell_id] = block_id
-        self.__blocks[block_id].add_locked_node(cell, self)
+        self.__nodes_locked[cid] = 1
+        self.__nodes_block_id[cid] = block_id
+        self.__blocks[block_id].add_locked_node(cid)
+        self.__moves[self.__moves_size] = cid
+        self.__moves_size += 1
 
-    def get_net_distribution(self, net, block_id) -> int:
+    def get_last_move(self) -> int:
         """
-        :return: the number of cells in the specified block of the net
+        :return: the node moved last in the current pass, -1 if none moved
         """
-        return self.__nets_distribution[net.net_id][block_id]
+        if self.__moves_size == 0:
+            return -1
+        return self.__moves[self.__moves_size - 1]
 
-    def inc_net_distribution(self, net, block_id):
+    def move_locked_node(self, cid, block_id):
         """
-        inc the number of cells in the specified block of the net
+        move a locked cell back to the given block, when undoing a move
         """
-        self.__nets_distribution[net.net_id][block_id] += 1
+        self.__blocks[self.__nodes_block_id[cid]].remove_locked_node(cid)
+        self.__nodes_block_id[cid] = block_id
+        self.__blocks[block_id].add_locked_node(cid)
 
-    def dec_net_distribution(self, net, block_id):
+    def update_node_gain(self, cid, adjust):
         """
-        dec the number of cells in the specified block of the net
+        update the cell's gain by the adjust value
         """
-        self.__nets_distribution[net.net_id][block_id] -= 1
+        gain = self.__nodes_gain[cid]
+        self.__nodes_gain[cid] = gain + adjust
+        # move node to the new position in the buckets of its block
+        if not self.__nodes_locked[cid]:
+            block = self.__blocks[self.__nodes_block_id[cid]]
+            block.update_node_gain(cid, gain, gain + adjust)
 
-    def reset_net_distribution(self, net):
+    def set_nets_distribution(self, block0, block1):
         """
-        reset the net distribution of the given net
+        replace the distribution of every net at once
+        :param block0: the number of cells of each net in block 0
+        :param block1: the number of cells of each net in block 1
         """
-        self.__nets_distribution[net.net_id] = [0, 0]
+        self.__nets_distribution = [block0, block1]
 
-    def update_node_gain(self, cell, adjust):
+    def set_large_nets(self, large_nets):
         """
-        update the cell's gain by the adjust value
+        set the nets left out of the gains
+        :param large_nets: 1 for every large net, 0 otherwise
         """
-        block_id = self.get_node_block_id(cell)
-        # remove node from the block
-        self.__blocks[block_id].remove_node(cell, self)
-        # update gain
-        self.__nodes_gain[cell.cell_id] += adjust
-        # add node to the new position in the bucket
-        self.__blocks[block_id].add_unlocked_node(cell, self)
+        self.__large_nets = bytearray(large_nets)
 
-    def get_node_gain(self, cell) -> int:
+    def get_large_nets(self) -> bytearray:
         """
-        :return: gain of the given cell
+        :return: 1 for every net left out of the gains, 0 otherwise
         """
-        return self.__nodes_gain[cell.cell_id]
+        return self.__large_nets
 
-    def inc_node_gain(self, cell):
+    def set_nodes_gain(self, gains):
         """
-        inc gain of the given cell
+        replace the gain of every cell at once
         """
-        self.__nodes_gain[cell.cell_id] += 1
+        self.__nodes_gain = gains
 
-    def dec_node_gain(self, cell):
+    def get_node_block_id(self, cid) -> int:
         """
-        dec gain of the given cell
+        :return: the block id of the given cell
         """
-        self.__nodes_gain[cell.cell_id] -= 1
+        return self.__nodes_block_id[cid]
 
-    def reset_node_gain(self, cell):
+    def get_node_block_ids(self) -> List[int]:
         """
-        reset gain of the given cell
+        :return: the cells' block id
         """
-        self.__nodes_gain[cell.cell_id] = 0
+        return self.__nodes_block_id
 
-    def get_node_block_id(self, cell) -> int:
+    def get_nodes_locked(self) -> bytearray:
         """
-        :return: the block id of the given cell
+        :return: the cells' locked flag, live state for read-only fast paths
         """
-        return self.__nodes_block_id[cell.cell_id]
+        return self.__nodes_locked
 
-    def get_node_block_ids(self) -> List[int]:
+    def get_nodes_gain(self) -> List[int]:
         """
-        :return: the cells' block id
+        :return: the cells' gain, live state, so a move may update the gain
+                 of locked cells in place
         """
-        return self.__nodes_block_id
+        return self.__nodes_gain
+
+    def get_nets_distribution(self) -> List[List[int]]:
+        """
+        :return: the number of cells of each net, per block; live state, so
+                 a move may update it in place
+        """
+        return self.__nets_distribution
 
     def get_block_size(self, block_id) -> int:
         """
@@ -167,6 +213,30 @@ class Data:
         """
         return self.__blocks[block_id].size()
 
+    def get_block_weight(self, block_id) -> int:
+        """
+        :return: the total weight of the cells in the given block
+        """
+        return self.__blocks[block_id].weight()
+
+    def get_node_weight(self, cid) -> int:
+        """
+        :return: the weight of the given cell
+        """
+        return self.__nodes_weight[cid]
+
+    def get_bucket_scans(self) -> int:
+        """
+        :return: the number of empty buckets stepped over by both blocks
+        """
+        return self.__blocks[0].bucket_scans + self.__blocks[1].bucket_scans
+
+    def peek_block_max_gain_node(self, block_id) -> int:
+        """
+        :return: the max gain node the given block, without removing it
+        """
+        return self.__blocks[block_id].peek_max_gain_node()
+
     def peek_block_max_gain(self, block_id) -> int:
         """
         :return: the max gain the given block
@@ -181,10 +251,8 @@ class Data:
 
     def print_blocks_size(self):
         """
-        print the size of each block
+        print the size of each block, at the debug level
         """
         logging.debug(
-            "block 0: {}, block 1: {}".format(
-                self.get_block_size(0), self.get_block_size(1)
-            )
+            "block 0: %s, block 1: %s", self.get_block_size(0), self.get_block_size(1)
         )
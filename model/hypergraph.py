@@ -0,0 +1,117 @@
+import numpy as np
+
+
+class Hypergraph:
+    """
+    compact, array-backed netlist in CSR form:
+        - the pins of net i are net_pins[net_ptr[i]:net_ptr[i + 1]]
+        - the nets of cell j are cell_nets[cell_ptr[j]:cell_ptr[j + 1]]
+    every cell also has an integer weight, 1 unless specified
+    """
+
+    def __init__(self, cells_size, net_ptr, net_pins, cell_weights=None):
+        self.net_ptr = np.asarray(net_ptr, dtype=np.int32)
+        self.net_pins = np.asarray(net_pins, dtype=np.int32)
+        if cell_weights is None:
+            self.cell_weights = np.ones(cells_size, dtype=np.int32)
+        else:
+            self.cell_weights = np.asarray(cell_weights, dtype=np.int32)
+
+        # transpose net -> pins into cell -> nets, a stable sort keeps the
+        # nets of every cell in increasing net id order
+        degrees = np.bincount(self.net_pins, minlength=cells_size)
+        self.cell_ptr = np.zeros(cells_size + 1, dtype=np.int32)
+        np.cumsum(degrees, out=self.cell_ptr[1:])
+        order = np.argsort(self.net_pins, kind="stable")
+        self.cell_nets = self.pin_nets()[order]
+
+        self.__lists = None
+
+    @classmethod
+    def from_csr(cls, net_ptr, net_pins, cell_ptr, cell_nets, cell_weights):
+        """
+        build a hypergraph from the arrays of both CSR directions, as stored
+        in a netlist cache; int32 arrays are used as is, without a copy
+        """
+        hypergraph = cls.__new__(cls)
+        hypergraph.net_ptr = np.asarray(net_ptr, dtype=np.int32)
+        hypergraph.net_pins = np.asarray(net_pins, dtype=np.int32)
+        hypergraph.cell_ptr = np.asarray(cell_ptr, dtype=np.int32)
+        hypergraph.cell_nets = np.asarray(cell_nets, dtype=np.int32)
+        hypergraph.cell_weights = np.asarray(cell_weights, dtype=np.int32)
+        hypergraph.__lists = None
+        return hypergraph
+
+    def __getstate__(self):
+        """
+        the list mirrors are a cache, rebuilt on demand after unpickling
+        """
+        state = self.__dict__.copy()
+        state["_Hypergraph__lists"] = None
+        return state
+
+    def get_cells_size(self) -> int:
+        """
+        :return: the number of cells in the hypergraph
+        """
+        return len(self.cell_ptr) - 1
+
+    def get_nets_size(self) -> int:
+        """
+        :return: the number of nets in the hypergraph
+        """
+        return len(self.net_ptr) - 1
+
+    def net_sizes(self) -> np.ndarray:
+        """
+        :return: the number of pins of each net
+        """
+        return np.diff(self.net_ptr)
+
+    def cell_degrees(self) -> np.ndarray:
+        """
+        :return: the number of nets of each cell
+        """
+        return np.diff(self.cell_ptr)
+
+    def pin_nets(self) -> np.ndarray:
+        """
+        :return: the net id of every entry of net_pins
+        """
+        return np.repeat(
+            np.arange(self.get_nets_size(), dtype=np.int32), self.net_sizes()
+        )
+
+    def net_cells(self, net_id) -> np.ndarray:
+        """
+        :return: the cells connected by the given net
+        """
+        return self.net_pins[self.net_ptr[net_id] : self.net_ptr[net_id + 1]]
+
+    def cell_nets_of(self, cell_id) -> np.ndarray:
+        """
+        :return: the nets connected to the given cell
+        """
+        return self.cell_nets[self.cell_ptr[cell_id] : self.cell_ptr[cell_id + 1]]
+
+    def get_pmax(self) -> int:
+        """
+        :return: pmax, which is the maximum number of nets on a cell
+        """
+        degrees = self.cell_degrees()
+        return int(degrees.max()) if len(degrees) else 0
+
+    def as_lists(self):
+        """
+        the move loop of the algorithms reads single entries of the CSR
+        arrays, which is much faster on python lists than on numpy scalars
+        :return: net_ptr, net_pins, cell_ptr, cell_nets as cached python lists
+        """
+        if self.__lists is None:
+            self.__lists = (
+                self.net_ptr.tolist(),
+                self.net_pins.tolist(),
+                self.cell_ptr.tolist(),
+                self.cell_nets.tolist(),
+            )
+        return self.__lists
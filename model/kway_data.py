@@ -0,0 +1,205 @@
+from array import array
+from typing import List
+
+from model.block import Block
+
+
+class KwayData:
+    """
+    data container of a k-way partition: a gain bucket structure per block,
+    and for every cell the gain of its best move along with the target block
+    of that move
+    """
+
+    def __init__(self, k, pmax, nets_size, nodes_block_id, nodes_weight):
+        self.k = k
+        self.iteration = 1
+
+        cells_size = len(nodes_block_id)
+        links = array("i", [-1]) * cells_size, array("i", [-1]) * cells_size
+        self.__blocks = [Block(pmax, links, nodes_weight) for _ in range(k)]
+        # the number of cells of net i in block j is at index i * k + j
+        self.__nets_distribution = [0] * (nets_size * k)
+        # the number of blocks each net has cells in
+        self.__nets_connectivity = [0] * nets_size
+        # cells start locked, out of the buckets, until the first pass
+        self.__nodes_locked = bytearray(b"\x01") * cells_size
+        self.__nodes_gain = [0] * cells_size
+        self.__nodes_target = [-1] * cells_size
+        self.__nodes_block_id = nodes_block_id
+        self.__nodes_weight = nodes_weight
+
+        # nodes moved in the current pass, in order, with the block they left
+        self.__moves = array("i", [-1]) * cells_size
+        self.__moves_from = array("i", [-1]) * cells_size
+        self.__moves_size = 0
+        self.__best_move = 0  # number of moves leading to the best cut
+        self.cutsize = None
+        self.prev_mincut = None
+        self.mincut = None
+
+    def reset_blocks(self):
+        """
+        empty the blocks, before the gains of a new pass are inserted
+        """
+        for block in self.__blocks:
+            block.reset()
+
+    def store_best_cut(self):
+        """
+        store the best cut, as the number of moves leading to it
+        """
+        self.__best_move = self.__moves_size
+        self.mincut = self.cutsize
+
+    def pop_moves_after_best_cut(self):
+        """
+        :return: the nodes moved after the best cut with the block each
+                 node left, latest first
+        """
+        moves = list(
+            zip(
+                self.__moves[self.__best_move : self.__moves_size],
+                self.__moves_from[self.__best_move : self.__moves_size],
+            )
+        )
+        moves.reverse()
+        return moves
+
+    def restore_best_cut(self):
+        """
+        restore the best cut in the current pass, once the moves after it
+        have been undone
+        """
+        self.__moves_size = 0
+        self.__best_move = 0
+        self.cutsize = self.mincut
+
+    def add_node(self, cid):
+        """
+        add the cell to its block as a locked node, when building the
+        partition, so the block weights are known before the first pass
+        """
+        self.__blocks[self.__nodes_block_id[cid]].add_locked_node(cid)
+
+    def unlock_node(self, cid):
+        """
+        unlock the cell, in the bucket of its gain in its block, once the
+        blocks have been reset
+        """
+        self.__nodes_locked[cid] = 0
+        block = self.__blocks[self.__nodes_block_id[cid]]
+        block.add_unlocked_node(cid, self.__nodes_gain[cid])
+
+    def set_node_move(self, cid, gain, target):
+        """
+        set the gain of the best move of the cell, and its target block
+        """
+        old = self.__nodes_gain[cid]
+        self.__nodes_gain[cid] = gain
+        self.__nodes_target[cid] = target
+        if old != gain and not self.__nodes_locked[cid]:
+            block = self.__blocks[self.__nodes_block_id[cid]]
+            block.update_node_gain(cid, old, gain)
+
+    def move_node(self, cid):
+        """
+        move the unlocked cell to its target block and lock it there, and
+        log the move
+        :return: the block the cell left, and the block it moved to
+        """
+        F, T = self.__nodes_block_id[cid], self.__nodes_target[cid]
+        self.__blocks[F].remove_node(cid, self.__nodes_gain[cid])
+        self.__blocks[T].add_locked_node(cid)
+        self.__nodes_locked[cid] = 1
+        self.__nodes_block_id[cid] = T
+
+        self.__moves[self.__moves_size] = cid
+        self.__moves_from[self.__moves_size] = F
+        self.__moves_size += 1
+        return F, T
+
+    def park_node(self, cid):
+        """
+        lock the unlocked cell in its block for the rest of the pass, when
+        none of its moves is legal
+        """
+        block = self.__blocks[self.__nodes_block_id[cid]]
+        block.remove_node(cid, self.__nodes_gain[cid])
+        block.add_locked_node(cid)
+        self.__nodes_locked[cid] = 1
+
+    def move_locked_node(self, cid, block_id):
+        """
+        move a locked cell to the given block, when undoing a move
+        """
+        self.__blocks[self.__nodes_block_id[cid]].remove_locked_node(cid)
+        self.__nodes_block_id[cid] = block_id
+        self.__blocks[block_id].add_locked_node(cid)
+
+    def block_has_unlocked_nodes(self, block_id) -> bool:
+        """
+        :return: True if there are unlocked nodes remains in the given block
+        """
+        return self.__blocks[block_id].has_unlocked_nodes()
+
+    def peek_block_max_gain_node(self, block_id) -> int:
+        """
+        :return: the max gain node the given block, without removing it
+        """
+        return self.__blocks[block_id].peek_max_gain_node()
+
+    def get_block_weight(self, block_id) -> int:
+        """
+        :return: the total weight of the cells in the given block
+        """
+        return self.__blocks[block_id].weight()
+
+    def get_block_weights(self) -> List[int]:
+        """
+        :return: the total weight of the cells in every block
+        """
+        return [block.weight() for block in self.__blocks]
+
+    def get_node_block_ids(self) -> List[int]:
+        """
+        :return: the cells' block id
+        """
+        return self.__nodes_block_id
+
+    def get_nodes_weight(self) -> List[int]:
+        """
+        :return: the cells' weight
+        """
+        return self.__nodes_weight
+
+    def get_nodes_locked(self) -> bytearray:
+        """
+        :return: the cells' locked flag, live state for read-only fast paths
+        """
+        return self.__nodes_locked
+
+    def get_nodes_gain(self) -> List[int]:
+        """
+        :return: the gain of every cell's best move, live state
+        """
+        return self.__nodes_gain
+
+    def get_nodes_target(self) -> List[int]:
+        """
+        :return: the target block of every cell's best move, live state
+        """
+        return self.__nodes_target
+
+    def get_nets_distribution(self) -> List[int]:
+        """
+        :return: the number of cells of each net in each block, flattened
+                 net by net; live state, so a move may update it in place
+        """
+        return self.__nets_distribution
+
+    def get_nets_connectivity(self) -> List[int]:
+        """
+        :return: the number of blocks each net has cells in; live state
+        """
+        return self.__nets_connectivity
@@ -1,8 +1,21 @@
+from util.colors import net_color
+
+
 class Net:
-    def __init__(self, net_id, color):
+    def __init__(self, net_id, color=None):
         self.net_id = net_id
         self.cells = []
-        self.color = color
+        self.__color = color
+        self.__line_ids = None
+
+    @property
+    def color(self):
+        """
+        the color of the net, only computed when it is first rendered
+        """
+        if self.__color is None:
+            self.__color = net_color(self.net_id)
+        return self.__color
 
     def add_cell(self, cell):
         """
@@ -21,3 +34,20 @@ class Net:
         :return: the sinks, which are the cell except the first one
         """
         return self.cells[1:]
+
+    def update(self, canvas):
+        """
+        draw a line from the source to every sink in the canvas, or move the
+        lines already drawn to the current cell positions
+        """
+        x1, y1 = self.get_source().center_coords()
+        if self.__line_ids is None:
+            self.__line_ids = [
+                canvas.create_line(
+                    x1, y1, *sink.center_coords(), tags="netlist", fill=self.color
+                )
+                for sink in self.get_sinks()
+            ]
+        else:
+            for line_id, sink in zip(self.__line_ids, self.get_sinks()):
+                canvas.coords(line_id, x1, y1, *sink.center_coords())
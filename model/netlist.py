@@ -0,0 +1,153 @@
+import logging
+import os
+
+import numpy as np
+
+from model.hypergraph import Hypergraph
+
+# binary cache written next to a netlist, with the hypergraph in CSR form
+CACHE_SUFFIX = ".csr"
+CACHE_MAGIC = 0x5253432D50524748  # "HGRP-CSR"
+CACHE_VERSION = 1
+# magic, version, cells, nets, pins, source size, source mtime, reserved
+HEADER_SIZE = 8
+# third header number of a netlist whose nets are followed, like in the
+# hMETIS format, by one line per cell holding the weight of the cell
+WEIGHTED_FORMAT = 10
+
+
+def load_netlist(file, cache=True) -> Hypergraph:
+    """
+    load a netlist, from its binary cache when the cache is up to date,
+    otherwise parse the text file and write the cache for the next run
+    :param cache: False to always parse the text file, and not write the cache
+    :return: the hypergraph of the netlist
+    """
+    if cache:
+        hypergraph = read_cache(file)
+        if hypergraph is not None:
+            logging.debug("loaded {} from its cache".format(file))
+            return hypergraph
+
+    hypergraph = read_netlist(file)
+    if cache:
+        try:
+            write_cache(file, hypergraph)
+        except OSError as e:
+            logging.debug("cannot cache {}: {}".format(file, e))
+    return hypergraph
+
+
+def read_netlist(file) -> Hypergraph:
+    """
+    parse a netlist in a single pass over the whole file: a "cells nets"
+    header line, then one line per net, the number of pins followed by the
+    cell id of every pin. like the line by line parser, the pins of a net
+    are all the numbers on its line, after the first one. with a "cells nets
+    10" header, the nets are followed by the weight of every cell
+    :return: the hypergraph of the netlist
+    """
+    with open(file, "rb") as f:
+        text = f.read()
+
+    values = np.fromstring(text, dtype=np.int64, sep=" ")
+    cells, nets = int(values[0]), int(values[1])
+
+    # the line of every number, from the position of its first character
+    raw = np.frombuffer(text, dtype=np.uint8)
+    space = raw <= ord(" ")
+    starts = np.flatnonzero(~space & np.concatenate(([True], space[:-1])))
+    lines = np.searchsorted(np.flatnonzero(raw == ord("\n")), starts)
+
+    # every number of a net line is a pin, except the leading pin count
+    first = np.ones(len(lines), dtype=bool)
+    first[1:] = lines[1:] != lines[:-1]
+    pins = ~first & (lines >= 1) & (lines <= nets)
+
+    net_ptr = np.zeros(nets + 1, dtype=np.int32)
+    np.cumsum(np.bincount(lines[pins] - 1, minlength=nets), out=net_ptr[1:])
+
+    weights = None
+    header = np.searchsorted(lines, 1)  # the number of values in the header
+    if header >= 3 and values[2] == WEIGHTED_FORMAT:
+        weights = values[lines > nets]
+        if len(weights) != cells:
+            raise ValueError(
+                "{}: expected {} cell weights, found {}".format(
+                    file, cells, len(weights)
+                )
+            )
+    return Hypergraph(cells, net_ptr, values[pins], weights)
+
+
+def cache_file(file) -> str:
+    """
+    :return: the path of the binary cache of the given netlist
+    """
+    return file + CACHE_SUFFIX
+
+
+def read_cache(file):
+    """
+    map the binary cache of a netlist in memory, the arrays of the
+    hypergraph are read-only views of the file rather than copies
+    :return: the hypergraph, or None if there is no up to date cache
+    """
+    path = cache_file(file)
+    try:
+        source = os.stat(file)
+        header = np.fromfile(path, dtype=np.int64, count=HEADER_SIZE)
+    except OSError:
+        return None
+
+    if (
+        len(header) != HEADER_SIZE
+        or header[0] != CACHE_MAGIC
+        or header[1] != CACHE_VERSION
+        or header[5] != source.st_size
+        or header[6] != source.st_mtime_ns
+    ):
+        return None
+
+    cells, nets, pins = (int(x) for x in header[2:5])
+    sizes = [nets + 1, pins, cells + 1, pins, cells]
+    arrays = np.memmap(path, dtype=np.int32, mode="r", offset=HEADER_SIZE * 8)
+    if len(arrays) != sum(sizes):
+        return None
+
+    offsets = np.cumsum([0] + sizes)
+    return Hypergraph.from_csr(
+        *(arrays[offsets[i] : offsets[i + 1]] for i in range(len(sizes)))
+    )
+
+
+def write_cache(file, hypergraph: Hypergraph):
+    """
+    write the binary cache of a netlist: a header, then the int32 arrays of
+    both CSR directions and the cell weights
+    """
+    source = os.stat(file)
+    header = np.zeros(HEADER_SIZE, dtype=np.int64)
+    header[:7] = [
+        CACHE_MAGIC,
+        CACHE_VERSION,
+        hypergraph.get_cells_size(),
+        hypergraph.get_nets_size(),
+        len(hypergraph.net_pins),
+        source.st_size,
+        source.st_mtime_ns,
+    ]
+
+    # write a temporary file first, so a cache is never read half written
+    path = cache_file(file)
+    with open(path + ".tmp", "wb") as f:
+        header.tofile(f)
+        for array in (
+            hypergraph.net_ptr,
+            hypergraph.net_pins,
+            hypergraph.cell_ptr,
+            hypergraph.cell_nets,
+            hypergraph.cell_weights,
+        ):
+            np.asarray(array, dtype=np.int32).tofile(f)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,102 @@
+import numpy as np
+
+# number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class Population:
+    """
+    genetic population stored as a single k x n uint8 matrix of block ids,
+    one row per chromosome, along with the mincut of every chromosome.
+    the rows are also kept packed 8 cells per byte, which answers the
+    distance and nearest member queries, and the number of chromosomes
+    placing every cell in block 1, which gives the diversity in O(n); rows
+    must only be changed through replace, which updates both incrementally
+    """
+
+    def __init__(self, chromosomes, mincuts):
+        self.chromosomes = np.asarray(chromosomes, dtype=np.uint8)
+        self.mincuts = np.asarray(mincuts, dtype=np.int64)
+        self.moves = 0  # moves made by the local improvement of the offspring
+        self.generation = 0  # generations evolved by genetic_loop
+
+        self.__bits = np.packbits(self.chromosomes, axis=1)
+        self.__ones = self.chromosomes.sum(axis=0, dtype=np.int64)
+
+    def size(self) -> int:
+        """
+        :return: the number of chromosomes in the population
+        """
+        return len(self.mincuts)
+
+    def get_block_ids(self, index) -> np.ndarray:
+        """
+        :return: the block id of every cell in the given chromosome
+        """
+        return self.chromosomes[index]
+
+    def get_mincut(self, index) -> int:
+        """
+        :return: the mincut of the given chromosome
+        """
+        return int(self.mincuts[index])
+
+    def replace(self, index, block_ids, mincut):
+        """
+        replace the given chromosome
+        """
+        block_ids = np.asarray(block_ids, dtype=np.uint8)
+        self.__ones += block_ids
+        self.__ones -= self.chromosomes[index]
+        self.chromosomes[index] = block_ids
+        self.mincuts[index] = mincut
+        self.__bits[index] = np.packbits(block_ids)
+
+    def distances(self, block_ids) -> np.ndarray:
+        """
+        :return: the Hamming distance between the given chromosome and every
+                 member of the population
+        """
+        bits = np.packbits(np.asarray(block_ids, dtype=np.uint8))
+        return popcount(self.__bits ^ bits)
+
+    def nearest(self, block_ids, candidates=None) -> int:
+        """
+        :param candidates: the indexes of the members to search, all by
+                           default; on a tie the first one is returned
+        :return: the index of the member most similar to the given chromosome
+        """
+        distances = self.distances(block_ids)
+        if candidates is None:
+            return int(np.argmin(distances))
+        candidates = np.asarray(candidates)
+        return int(candidates[np.argmin(distances[candidates])])
+
+    def diversity(self) -> float:
+        """
+        :return: the mean Hamming distance between two members; a cell
+                 placed in block 1 by c of the k members differs in
+                 c * (k - c) of the pairs
+        """
+        k = self.size()
+        ones = self.__ones
+        return 2 * float(np.dot(ones, k - ones)) / max(1, k * (k - 1))
+
+    def best(self) -> int:
+        """
+        :return: the index of the chromosome with the smallest mincut
+        """
+        return int(np.argmin(self.mincuts))
+
+    def worst(self) -> int:
+        """
+        :return: the index of the chromosome with the largest mincut
+        """
+        return int(np.argmax(self.mincuts))
+
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """
+    :return: the number of set bits of every row of packed bits
+    """
+    return POPCOUNT[bits].sum(axis=-1, dtype=np.int64)
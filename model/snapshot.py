@@ -0,0 +1,53 @@
+from typing import List
+
+
+class Snapshot:
+    """
+    a copy of the state of a partition that a renderer needs, taken while
+    the algorithm keeps changing the partition in another thread
+    """
+
+    def __init__(self, data, cids=None):
+        """
+        :param cids: the cells changed since the previous snapshot, None if
+                     every cell may have
+        """
+        self.cids = cids
+        self.cutsize = data.cutsize
+        self.iteration = data.iteration
+        self.__nodes_block_id = list(data.get_node_block_ids())
+        self.__nodes_locked = bytes(data.get_nodes_locked())
+
+    @classmethod
+    def from_population(cls, population):
+        """
+        take a snapshot of the best chromosome of a genetic population, with
+        no cell locked, without building a data container for it
+        """
+        best = population.best()
+        block_ids = population.get_block_ids(best)
+        snapshot = cls.__new__(cls)
+        snapshot.cids = None
+        snapshot.cutsize = population.get_mincut(best)
+        snapshot.iteration = population.generation
+        snapshot.__nodes_block_id = block_ids.tolist()
+        snapshot.__nodes_locked = bytes(len(block_ids))
+        return snapshot
+
+    def get_node_block_id(self, cid) -> int:
+        """
+        :return: the block id of the given cell
+        """
+        return self.__nodes_block_id[cid]
+
+    def get_node_block_ids(self) -> List[int]:
+        """
+        :return: the cells' block id
+        """
+        return self.__nodes_block_id
+
+    def is_node_locked(self, cid) -> bool:
+        """
+        :return: True if cell is locked
+        """
+        return self.__nodes_locked[cid] == 1
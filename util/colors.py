@@ -1,34 +1,12 @@
-import random
-from typing import List
-
-# https://gist.github.com/adewes/5884820
+import colorsys
 
 locked_color = ["spring green", "firebrick1"]
+# the same colors as rgb, to blend them
+locked_rgb = [(0.0, 1.0, 0.5), (1.0, 0.19, 0.19)]
 
-
-def get_random_color(pastel_factor=0.5):
-    return [
-        (x + pastel_factor) / (1.0 + pastel_factor)
-        for x in [random.uniform(0, 1.0) for _ in [1, 2, 3]]
-    ]
-
-
-def color_distance(c1, c2):
-    return sum([abs(x[0] - x[1]) for x in zip(c1, c2)])
-
-
-def generate_new_color(existing_colors, pastel_factor=0.5):
-    max_distance = None
-    best_color = None
-    for _ in range(0, 10):
-        color = get_random_color(pastel_factor=pastel_factor)
-        if not existing_colors:
-            return color
-        best_distance = min([color_distance(color, c) for c in existing_colors])
-        if not max_distance or best_distance > max_distance:
-            max_distance = best_distance
-            best_color = color
-    return best_color
+# stepping the hue by the golden ratio spreads any number of consecutive
+# colors evenly around the color wheel, without comparing them
+GOLDEN_RATIO = 0.618033988749895
 
 
 def from_rgb(rgb) -> str:
@@ -41,16 +19,18 @@ def from_rgb(rgb) -> str:
     return "#{:02X}{:02X}{:02X}".format(r, g, b)
 
 
-def random_colors(n) -> List[str]:
+def net_color(net_id) -> str:
     """
-    :param n: the number of colors required
-    :return: a list of n unique random colors
+    :return: the color of the given net, distinct from the nets next to it,
+             in constant time
     """
-    colors, ret = [], []
+    hue = (net_id * GOLDEN_RATIO) % 1.0
+    return from_rgb(colorsys.hsv_to_rgb(hue, 0.55, 0.95))
 
-    for _ in range(n):
-        color = generate_new_color(colors, pastel_factor=0.3)
-        colors.append(color)
-        ret.append(from_rgb(color))
 
-    return ret
+def heat_color(block_id, share) -> str:
+    """
+    :param share: the share of locked cells, from 0 to 1
+    :return: white blended with the locked color of the block by the share
+    """
+    return from_rgb([1 - share * (1 - c) for c in locked_rgb[block_id]])
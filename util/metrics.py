@@ -0,0 +1,136 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+PROFILERS = ("cprofile", "tracemalloc")
+
+# the timer handed out while disabled, entering it does nothing
+NULL_TIMER = nullcontext()
+
+
+class Timer:
+    """
+    time the calls of a phase, accumulated in the metrics
+    """
+
+    __slots__ = ("timings", "start")
+
+    def __init__(self, timings):
+        """
+        :param timings: the [calls, seconds] of the phase, updated on exit
+        """
+        self.timings = timings
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings[0] += 1
+        self.timings[1] += time.perf_counter() - self.start
+        return False
+
+
+class Metrics:
+    """
+    counters and per-phase timers of a run; while disabled, count is a
+    single test and timer returns a shared no-op context, so the phases
+    pay nothing. hot loops keep their counts in plain ints of the data
+    containers, which are handed to count once per pass
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.__counters = {}
+        self.__timings = {}
+
+    def enable(self, enabled=True):
+        """
+        enable or disable the collection, keeping what was collected
+        """
+        self.enabled = enabled
+
+    def reset(self):
+        """
+        clear the counters and timers
+        """
+        self.__counters = {}
+        self.__timings = {}
+
+    def count(self, name, value=1):
+        """
+        add value to the given counter
+        """
+        if self.enabled:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def timer(self, name):
+        """
+        :return: a context manager timing the phase it encloses
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        timings = self.__timings.get(name)
+        if timings is None:
+            timings = self.__timings[name] = [0, 0.0]
+        return Timer(timings)
+
+    def report(self) -> dict:
+        """
+        :return: every counter, and the calls and total seconds of every
+                 phase, as <phase>_calls and <phase>_seconds
+        """
+        report = dict(self.__counters)
+        for name, (calls, seconds) in self.__timings.items():
+            report[name + "_calls"] = calls
+            report[name + "_seconds"] = round(seconds, 6)
+        return report
+
+
+# the metrics of the current run, disabled unless a run asks for them
+metrics = Metrics()
+
+
+@contextmanager
+def profile(profiler=None, top=15):
+    """
+    run the enclosed code under a profiler, and log its report
+    :param profiler: "cprofile" for the functions taking the most time,
+                     "tracemalloc" for the peak memory and the lines
+                     allocating the most, None to run without profiling
+    :param top: the number of functions or lines logged
+    """
+    if profiler is None:
+        yield
+    elif profiler == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(top)
+            logging.info(stream.getvalue())
+    elif profiler == "tracemalloc":
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            lines = tracemalloc.take_snapshot().statistics("lineno")[:top]
+            tracemalloc.stop()
+            metrics.count("traced_peak_kb", peak // 1024)
+            logging.info(
+                "traced peak: {} KiB\n{}".format(
+                    peak // 1024, "\n".join(str(line) for line in lines)
+                )
+            )
+    else:
+        raise ValueError("unknown profiler: {}".format(profiler))
@@ -0,0 +1,68 @@
+import json
+import os
+import time
+
+
+class Trace:
+    """
+    stream of convergence events, written as one JSON object per line as
+    soon as they happen, so a run can be followed or plotted while it goes
+    on; every event holds the run it belongs to and the seconds elapsed
+    since that run began. events are only emitted per pass or generation,
+    so the trace can be left on
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.__file = None
+        self.__pid = None
+        self.__run = 0
+        self.__start = 0.0
+
+    def open(self, file):
+        """
+        start writing the events to the given file
+        """
+        self.close()
+        self.__file = open(file, "w")
+        # worker processes forked from this one inherit the trace, but
+        # must not write to its file
+        self.__pid = os.getpid()
+        self.__run = 0
+        self.enabled = True
+
+    def close(self):
+        """
+        stop writing the events
+        """
+        if self.__file is not None:
+            self.__file.close()
+        self.__file = None
+        self.enabled = False
+
+    def begin(self, **fields):
+        """
+        start a new run, described by a "run" event with the given fields
+        """
+        self.__run += 1
+        self.__start = time.perf_counter()
+        self.event("run", **fields)
+
+    def event(self, kind, **fields):
+        """
+        write an event of the given kind, with the given fields
+        """
+        if not self.enabled or os.getpid() != self.__pid:
+            return
+        record = {
+            "event": kind,
+            "run": self.__run,
+            "t": round(time.perf_counter() - self.__start, 6),
+        }
+        record.update(fields)
+        self.__file.write(json.dumps(record) + "\n")
+        self.__file.flush()
+
+
+# the trace of the current process, disabled unless a file is opened
+trace = Trace()
@@ -0,0 +1,101 @@
+import logging
+import queue
+import threading
+import time
+
+from algorithms.genetic import genetic
+from algorithms.kl import kl
+from algorithms.observer import Observer
+from model.circuit import Circuit
+from model.snapshot import Snapshot
+
+ALGORITHMS = {"kl": kl, "genetic": genetic}
+
+
+class Cancelled(Exception):
+    """
+    raised from the observer hooks to unwind a cancelled run
+    """
+
+
+class Worker(Observer, threading.Thread):
+    """
+    run a partitioning algorithm in a background thread, pushing snapshots
+    of its progress to a queue, at most max_fps per second; the run is never
+    slowed down by the rendering of the snapshots
+    """
+
+    def __init__(self, circuit: Circuit, algorithm, rng, watch_moves=True, max_fps=30):
+        Observer.__init__(self)
+        threading.Thread.__init__(self, name="partition", daemon=True)
+        self.circuit = circuit
+        self.algorithm = algorithm
+        self.rng = rng
+        self.watch_moves = watch_moves
+        self.snapshots = queue.Queue()
+        self.__period = 1 / max_fps
+        self.__cancelled = threading.Event()
+        # cells changed since the last snapshot, None when every cell may have
+        self.__changed = set()
+        self.__next_snapshot = 0.0
+
+    def cancel(self):
+        """
+        ask the run to stop at its next progress report
+        """
+        self.__cancelled.set()
+
+    def cancelled(self) -> bool:
+        """
+        :return: True if the run was asked to stop
+        """
+        return self.__cancelled.is_set()
+
+    def run(self):
+        try:
+            data = ALGORITHMS[self.algorithm](self.circuit, self, rng=self.rng)
+            # the last progress reports may have been skipped
+            self.snapshots.put(Snapshot(data))
+        except Cancelled:
+            logging.info("{} cancelled".format(self.algorithm))
+        except Exception:
+            logging.exception("{} failed".format(self.algorithm))
+
+    def on_move(self, data):
+        # only the moved node changes, it is now locked in its new block
+        self.__report(data, [data.get_last_move()])
+
+    def on_pass(self, data):
+        self.__report(data)
+
+    def on_generation(self, population):
+        if self.__cancelled.is_set():
+            raise Cancelled()
+        now = time.perf_counter()
+        if now < self.__next_snapshot:
+            return
+        self.__next_snapshot = now + self.__period
+        # only the best chromosome is rendered
+        self.snapshots.put(Snapshot.from_population(population))
+
+    def __report(self, data, cids=None):
+        """
+        push a snapshot of the partition, unless one was pushed less than a
+        frame ago; the cells changed meanwhile go with the next snapshot
+        :param cids: the cells changed, None if every cell may have
+        """
+        if self.__cancelled.is_set():
+            raise Cancelled()
+
+        if cids is None:
+            self.__changed = None
+        elif self.__changed is not None:
+            self.__changed.update(cids)
+
+        now = time.perf_counter()
+        if now < self.__next_snapshot:
+            return
+        self.__next_snapshot = now + self.__period
+
+        self.snapshots.put(Snapshot(data, self.__changed))
+        self.__changed = set()